@@ -1,159 +1,49 @@
 from simulator import *
 from Topology import *
-import json
+from topo_builder import set_16_rank_topo
+from router import ROUTING_STATIC
+from trace_writer import TraceWriter
+from workload import load_workload, add_workload_to_simulator
 import random
 import sys
 
 
 
-def set_16_rank_topo(simulator, topo, num, bandwidth, delay):
-    link_id = 1
-    link_dict = {}
-    # host->leaf
-    for i in range(8):
-        topo.add_link(f"link{link_id}", str(i), "16")
-        simulator.add_link(f"link{link_id}", 200, 0.05)
-        link_dict[f"link{link_id}"] = (str(i), "16")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "16", str(i))
-        simulator.add_link(f"link{link_id}", 200, 0.05)
-        link_dict[f"link{link_id}"] = ("16", str(i))
-        link_id += 1
-    for i in range(8):
-        topo.add_link(f"link{link_id}", str(8 + i), "17")
-        simulator.add_link(f"link{link_id}", 200, 0.05)
-        link_dict[f"link{link_id}"] = (str(8 + i), "17")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "17", str(8 + i))
-        simulator.add_link(f"link{link_id}", 200, 0.05)
-        link_dict[f"link{link_id}"] = ("17", str(8 + i))
-        link_id += 1
-
-    # leaf->spine
-    for i in range(4):
-        topo.add_link(f"link{link_id}", "16", "18")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("16", "18")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "18", "16")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("18", "16")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "17", "19")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("17", "19")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "19", "17")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("19", "17")
-        link_id += 1
-    
-    # spine->core
-    for i in range(4):
-        topo.add_link(f"link{link_id}", "18", "20")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("18", "20")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "20", "18")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("20", "18")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "19", "21")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("19", "21")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "21", "19")
-        simulator.add_link(f"link{link_id}", 400, 0.05)
-        link_dict[f"link{link_id}"] = ("21", "19")
-        link_id += 1
-    
-    # core->core
-    for i in range(num):
-        topo.add_link(f"link{link_id}", "20", "21")
-        simulator.add_link(f"link{link_id}", bandwidth, delay)
-        link_dict[f"link{link_id}"] = ("20", "21")
-        with open(f"{file_name}_core_links.txt", "a") as file:
-            file.write(f"link{link_id}\n")
-        link_id += 1
-        topo.add_link(f"link{link_id}", "21", "20")
-        simulator.add_link(f"link{link_id}", bandwidth, delay)
-        link_dict[f"link{link_id}"] = ("21", "20")
-        with open(f"{file_name}_core_links.txt", "a") as file:
-            file.write(f"link{link_id}\n")
-        link_id += 1
-    
-    return link_dict
-    
-    
-
-
 if __name__ == "__main__":
-    # 清空 link_load.txt 和 records.txt
-    if len(sys.argv) != 3:
-        print("Usage: python 16-rack-simulate.py <num> <bandwidth>")
+    if len(sys.argv) not in (3, 4, 5, 6):
+        print("Usage: python 16-rack-simulate.py <num> <bandwidth> [equal_share|max_min] [seed] "
+              "[static|least_loaded|power_of_two|flowlet]")
         sys.exit(1)
     
     num = int(sys.argv[1])
     bandwidth = int(sys.argv[2])
+    rate_mode = sys.argv[3] if len(sys.argv) >= 4 else RATE_EQUAL_SHARE
+    # 选路随机种子：未给出时随机取一个并打印，便于复现
+    seed = int(sys.argv[4]) if len(sys.argv) >= 5 else random.randrange(2 ** 32)
+    routing = sys.argv[5] if len(sys.argv) == 6 else ROUTING_STATIC
     delay = 2
     file_name = f"link_num_{num}_bandwidth_{bandwidth}_delay_{delay}"
-    open(f'{file_name}_link_load.txt', 'w').close()
-    open(f'{file_name}_link_util.txt', 'w').close()
-    open(f'{file_name}_records.txt', 'w').close()
-    open(f'{file_name}_rate_record.txt', 'w').close()
-    open(f'{file_name}_flow_path_record.txt', 'w').close()
-    open(f'{file_name}_core_links.txt', 'w').close()
     
-    # 创建仿真器
-    simulator = Simulator(file_name)
+    # 创建仿真器（二进制轨迹 + 供show_*.py使用的文本导出）
+    simulator = Simulator(file_name, trace=TraceWriter(file_name, text=True), rate_mode=rate_mode)
     topo = Topology()
-    link_dict = set_16_rank_topo(simulator, topo, num, bandwidth, delay)
-    # 添加流
+    fabric = set_16_rank_topo(simulator, topo, num, bandwidth, delay)
+    # 添加流（编译后的workload按内容哈希缓存，后续运行直接加载）
     workload_file = "/home/denghaotian/research/LLM_planning/data/workload_16_PP4_DP4_TP1_VPP2_BATCH8_NO_PRI.json"
-    with open(workload_file, 'r') as f:
-        workload = json.load(f)
-        
-    task_num = 0
-    flow_num = 0
-    
-    for i in range(len(workload)):
-        op_list = workload[i]['ops']
-        for op in op_list:
-            if op["op_type"] == "gpu":
-                if "depends" in op:
-                    if op["depends"] != "":
-                        simulator.add_task(op["op_name"], op["duration"] / 1000, dependency = op["depends"])
-                    else:
-                        simulator.add_task(op["op_name"], op["duration"] / 1000, dependency=None)
-                else:
-                    simulator.add_task(op["op_name"], op["duration"] / 1000, dependency=None)
-                task_num += 1
-            elif op["op_type"] == "send":
-                flow_path_list = topo.find_all_paths(str(op["src_rank"]), str(op["dst_rank"]))
-                flow_name_path = random.choice(flow_path_list)
-                with open(f"{file_name}_flow_path_record.txt", "a") as file:
-                    flow_id = op["op_name"]
-                    # path_nodes = []
-                    # for link_name in flow_name_path:
-                    #     src, dst = link_dict[link_name]
-                    #     if not path_nodes:
-                    #         path_nodes.append(src)
-                    #     path_nodes.append(dst)
-                    file.write(f"{flow_id}: {flow_name_path}\n")
-                    
-                flow_path = []
-                for link_name in flow_name_path:
-                    flow_path.append(simulator.links[link_name])
-                if "depends" in op:
-                    if op["depends"] != "":
-                        simulator.add_flow(op["op_name"], op["size"], flow_path, dependency=op["depends"])
-                    else:
-                        simulator.add_flow(op["op_name"], op["size"], flow_path, dependency=None)
-                else:
-                    simulator.add_flow(op["op_name"], op["size"], flow_path, dependency=None)
-                flow_num += 1
-    simulator.run()
-    print(f"task_num: {task_num}, flow_num: {flow_num}, total_num: {task_num + flow_num}")
+    workload = load_workload(workload_file)
+    # 动态选路时路径在流开始时才选定，运行期间保持路径记录文件打开
+    with open(f"{file_name}_flow_path_record.txt", "w") as path_record:
+        task_num, flow_num = add_workload_to_simulator(workload, simulator, topo, random.Random(seed), path_record,
+                                                       routing)
+        simulator.run()
+    simulator.close()
+    print(f"task_num: {task_num}, flow_num: {flow_num}, total_num: {task_num + flow_num}, seed: {seed}")
+    # core链路各方向的时间加权利用率（在线统计，不依赖link_util轨迹）
+    _, role_stats = simulator.link_util_report()
+    for role in fabric.core_roles():
+        stats = role_stats[role]
+        print(f"{role}: mean util {stats['mean_util'] * 100:.2f}%, peak {stats['peak_util'] * 100:.2f}%, "
+              f"p99 {stats['p99_util'] * 100:.0f}%, idle {stats['idle_fraction'] * 100:.2f}%")
     # 读取 records.txt，并且print最后一行
                     
             
@@ -1,3 +1,39 @@
+import bisect
+import itertools
+from collections import deque
+
+
+class EcmpEntry:
+    """一对节点间的ECMP路径索引：最短节点路径 + 每一跳的并行链路组"""
+    def __init__(self, node_paths, hop_groups):
+        self.node_paths = node_paths    # 最短路径（节点元组）
+        self.hop_groups = hop_groups    # 每条节点路径上各跳的并行链路id元组
+        # 按各节点路径展开后的链路级路径数加权，保证在所有链路级路径中均匀选择
+        weights = [1] * len(hop_groups)
+        for i, groups in enumerate(hop_groups):
+            for group in groups:
+                weights[i] *= len(group)
+        self.cumulative_weights = list(itertools.accumulate(weights))
+
+    def num_paths(self):
+        return self.cumulative_weights[-1] if self.cumulative_weights else 0
+
+    def choose(self, rng):
+        """随机选一条等价最短路径（链路id元组），与并行链路数量无关"""
+        if not self.hop_groups:
+            return None
+        if len(self.hop_groups) == 1:
+            groups = self.hop_groups[0]
+        else:
+            r = rng.random() * self.cumulative_weights[-1]
+            groups = self.hop_groups[bisect.bisect_right(self.cumulative_weights, r)]
+        return tuple(group[0] if len(group) == 1 else rng.choice(group) for group in groups)
+
+    def all_paths(self):
+        """展开所有链路级路径"""
+        return [path for groups in self.hop_groups for path in itertools.product(*groups)]
+
+
 class Topology:
     def __init__(self):
         # 邻接表结构：{
@@ -5,16 +41,148 @@ class Topology:
         #   ...
         # }
         self.adjacency = {}
+        self.link_names = []        # 链路整数id -> 链路名称
+        self.link_ids = {}          # 链路名称 -> 链路整数id
+        self.link_ends = []         # 链路整数id -> (起点, 终点)
+        self.hop_links = {}         # (起点, 终点) -> [并行链路id, ...]
+        self.reverse_adjacency = {} # 终点 -> {起点, ...}
+        self._distance_cache = {}   # 终点 -> {节点: 到终点的跳数}
+        self._ecmp_cache = {}       # (起点, 终点) -> EcmpEntry
+        self._path_cache = {}       # (起点, 终点, 跳数上限) -> 路径列表
     
+    def add_links(self, link_specs):
+        """批量添加单向链路，link_specs: [(链路名称, 起点, 终点), ...]，返回链路整数id列表"""
+        link_ids = [self._add_link(link_name, start_node, end_node) for link_name, start_node, end_node in link_specs]
+        self._invalidate_indexes()
+        return link_ids
+
     def add_link(self, link_name, start_node, end_node):
-        """添加单向链路"""
+        """添加单向链路，返回链路整数id"""
+        link_id = self._add_link(link_name, start_node, end_node)
+        self._invalidate_indexes()
+        return link_id
+
+    def _invalidate_indexes(self):
+        """拓扑变化后索引失效"""
+        self._distance_cache.clear()
+        self._ecmp_cache.clear()
+        self._path_cache.clear()
+
+    def _add_link(self, link_name, start_node, end_node):
         # 添加节点到邻接表（如果不存在）
         self.adjacency.setdefault(start_node, [])
         # 添加单向连接关系
         self.adjacency[start_node].append((end_node, link_name))
-    
+
+        link_id = len(self.link_names)
+        self.link_names.append(link_name)
+        self.link_ids[link_name] = link_id
+        self.link_ends.append((start_node, end_node))
+        self.hop_links.setdefault((start_node, end_node), []).append(link_id)
+        self.reverse_adjacency.setdefault(end_node, set()).add(start_node)
+        return link_id
+
+    def path_names(self, path):
+        """链路id路径转为链路名称列表"""
+        return [self.link_names[link_id] for link_id in path]
+
+    def distances_to(self, end):
+        """反向BFS：各节点到end的最少跳数（缓存）"""
+        distances = self._distance_cache.get(end)
+        if distances is None:
+            distances = {end: 0}
+            queue = deque([end])
+            while queue:
+                node = queue.popleft()
+                for prev in self.reverse_adjacency.get(node, ()):
+                    if prev not in distances:
+                        distances[prev] = distances[node] + 1
+                        queue.append(prev)
+            self._distance_cache[end] = distances
+        return distances
+
+    def ecmp(self, start, end):
+        """start到end的ECMP索引（缓存）"""
+        key = (start, end)
+        entry = self._ecmp_cache.get(key)
+        if entry is None:
+            distances = self.distances_to(end)
+            node_paths = []
+            if start in distances and start != end:
+                # 只沿到终点跳数递减的边前进，得到全部最短节点路径
+                stack = [(start, (start,))]
+                while stack:
+                    node, nodes = stack.pop()
+                    if node == end:
+                        node_paths.append(nodes)
+                        continue
+                    next_nodes = {neighbor for neighbor, _ in self.adjacency.get(node, [])
+                                  if distances.get(neighbor) == distances[node] - 1}
+                    for neighbor in sorted(next_nodes, key=str, reverse=True):
+                        stack.append((neighbor, nodes + (neighbor,)))
+            hop_groups = [tuple(tuple(self.hop_links[hop]) for hop in zip(nodes, nodes[1:]))
+                          for nodes in node_paths]
+            entry = EcmpEntry(node_paths, hop_groups)
+            self._ecmp_cache[key] = entry
+        return entry
+
+    def choose_path(self, start, end, rng):
+        """O(1)随机选一条等价最短路径（链路id元组），不可达时返回None"""
+        return self.ecmp(start, end).choose(rng)
+
+    def shortest_paths(self, start, end):
+        """所有等价最短路径（链路id元组列表）"""
+        return self.ecmp(start, end).all_paths()
+
+    def find_paths(self, start, end, max_hops):
+        """跳数不超过max_hops的所有无环路径（链路id元组列表，按跳数排序，缓存）"""
+        key = (start, end, max_hops)
+        paths = self._path_cache.get(key)
+        if paths is not None:
+            return paths
+        distances = self.distances_to(end)
+        paths = []
+
+        def dfs(current, path_links, visited_nodes):
+            if current == end:
+                paths.append(tuple(path_links))
+                return
+            for neighbor, link_name in self.adjacency.get(current, []):
+                # 剪枝：剩余跳数不足以到达终点
+                if neighbor in visited_nodes or len(path_links) + 1 + distances.get(neighbor, max_hops + 1) > max_hops:
+                    continue
+                visited_nodes.add(neighbor)
+                path_links.append(self.link_ids[link_name])
+                dfs(neighbor, path_links, visited_nodes)
+                path_links.pop()
+                visited_nodes.remove(neighbor)
+
+        if start in distances:
+            dfs(start, [], {start})
+        paths.sort(key=len)
+        self._path_cache[key] = paths
+        return paths
+
+    def k_shortest_paths(self, start, end, k, max_hops=None):
+        """按跳数从少到多取前k条无环路径（链路id元组列表）"""
+        distances = self.distances_to(end)
+        if start not in distances:
+            return []
+        # 无环路径的跳数不超过节点数-1
+        num_nodes = len(set(self.adjacency) | set(self.reverse_adjacency))
+        limit = min(max_hops, num_nodes - 1) if max_hops is not None else num_nodes - 1
+        hops = distances[start]
+        paths = []
+        # 逐步放宽跳数上限，直到凑够k条
+        while hops <= limit:
+            paths = self.find_paths(start, end, hops)
+            if len(paths) >= k:
+                break
+            hops += 1
+        return paths[:k]
+
     def find_all_paths(self, start, end):
-        """查找所有路径（使用深度优先搜索）"""
+        """查找所有路径（使用深度优先搜索，穷举所有无环路径，开销大，优先使用choose_path）"""
         def dfs(current, path_links, visited_nodes, all_paths):
             if current == end:
                 all_paths.append(list(path_links))
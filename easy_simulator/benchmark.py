@@ -0,0 +1,121 @@
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+from rate_allocator import RATE_EQUAL_SHARE
+from simulator import Simulator
+from sweep import write_results
+from Topology import Topology
+from topo_builder import build_clos
+from workload import load_workload, add_workload_to_simulator
+from workload_gen import generate_workload, write_workload
+
+# 规模依次增大的基准配置（workload_gen.generate_workload的参数）
+DEFAULT_SCALES = [
+    {"pp": 4, "dp": 4, "tp": 1, "vpp": 1, "micro_batches": 8},
+    {"pp": 4, "dp": 4, "tp": 1, "vpp": 2, "micro_batches": 16},
+    {"pp": 4, "dp": 8, "tp": 2, "vpp": 2, "micro_batches": 16},
+    {"pp": 8, "dp": 8, "tp": 2, "vpp": 2, "micro_batches": 32},
+    {"pp": 8, "dp": 16, "tp": 4, "vpp": 2, "micro_batches": 32},
+]
+DEFAULT_WORKLOAD_DIR = "benchmark_workloads"
+HOSTS_PER_RACK = 8
+
+
+def scale_name(scale):
+    return "PP{pp}_DP{dp}_TP{tp}_VPP{vpp}_BATCH{micro_batches}".format(**scale)
+
+
+def prepare_workload(scale, workload_dir=DEFAULT_WORKLOAD_DIR):
+    """生成（已存在时复用）该规模的workload文件，返回路径"""
+    os.makedirs(workload_dir, exist_ok=True)
+    path = os.path.join(workload_dir, f"workload_{scale_name(scale)}.json")
+    if not os.path.exists(path):
+        write_workload(generate_workload(**scale), path)
+    return path
+
+
+def _peak_rss_mb():
+    """本进程的内存峰值（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024  # macOS为字节，Linux为KB
+
+
+def run_benchmark(scale, workload_file, rate_mode):
+    """
+    在当前进程中运行一个规模：两级leaf-spine拓扑（每rack 8个host），不写轨迹
+    :return: 一行结果（规模参数、op/流/事件数、各阶段耗时、事件处理速率、内存峰值）
+    """
+    start = time.perf_counter()
+    workload = load_workload(workload_file, cache_dir=None)
+    load_time = time.perf_counter() - start
+
+    ranks = scale["pp"] * scale["dp"] * scale["tp"]
+    hosts_per_rack = min(HOSTS_PER_RACK, ranks)
+    start = time.perf_counter()
+    simulator = Simulator(scale_name(scale), trace=False, rate_mode=rate_mode)
+    topo = Topology()
+    build_clos(simulator, topo, -(-ranks // hosts_per_rack), hosts_per_rack)
+    task_num, flow_num = add_workload_to_simulator(workload, simulator, topo, random.Random(0))
+    build_time = time.perf_counter() - start
+
+    profiler = simulator.enable_profiling()
+    simulator.run()
+    simulator.close()
+    report = profiler.report()
+    end_times = [obj.end_time for objects in (simulator.flows, simulator.tasks)
+                 for obj in objects.values() if obj.end_time is not None]
+
+    result = dict(scale)
+    result.update({
+        "ranks": ranks,
+        "rate_mode": rate_mode,
+        "ops": len(workload),
+        "flows": flow_num,
+        "tasks": task_num,
+        "events": report["events"],
+        "load_time": load_time,
+        "build_time": build_time,
+        "run_time": report["timers"]["run"],
+        "events_per_sec": report["events_per_sec"],
+        "heap_high_water": report["heap_high_water"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "makespan": max(end_times, default=0),
+    })
+    return result
+
+
+def run_suite(scales=DEFAULT_SCALES, rate_mode=RATE_EQUAL_SHARE, workload_dir=DEFAULT_WORKLOAD_DIR):
+    """
+    依次运行各规模；每个规模在单独的子进程中运行，内存峰值互不影响
+    :return: 结果表（每个规模一行）
+    """
+    results = []
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    for scale in scales:
+        workload_file = prepare_workload(scale, workload_dir)
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(run_benchmark, (scale, workload_file, rate_mode))
+        print(f"{scale_name(scale)}: ranks {result['ranks']}, events {result['events']}, "
+              f"run {result['run_time']:.2f}s, {result['events_per_sec']:.0f} events/s, "
+              f"peak {result['peak_rss_mb']:.0f}MB", flush=True)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按规模递增运行仿真器基准")
+    parser.add_argument("--scales", type=int, default=len(DEFAULT_SCALES),
+                        help=f"运行前几个规模（共{len(DEFAULT_SCALES)}个）")
+    parser.add_argument("--rate-mode", default=RATE_EQUAL_SHARE)
+    parser.add_argument("--workload-dir", default=DEFAULT_WORKLOAD_DIR)
+    parser.add_argument("--output", default="benchmark_results.csv")
+    args = parser.parse_args()
+
+    results = run_suite(DEFAULT_SCALES[:args.scales], args.rate_mode, args.workload_dir)
+    write_results(results, args.output)
@@ -0,0 +1,270 @@
+import argparse
+import heapq
+import random
+import time
+
+import numpy as np
+
+from rate_allocator import RATE_EQUAL_SHARE, RATE_MAX_MIN, max_min_fair_rates
+from simulator import Simulator, Flow
+from observer import FLOW_START, FLOW_END, TASK_START, TASK_END, ObjectEvent
+
+
+def run_fluid(simulator, quantum):
+    """
+    近似的时间步进（流体）模式：时间按quantum（秒）分步，同一步内完成的流/任务在步末统一释放依赖，
+    后继从步末开始，流在完成所在的步末才让出带宽，因此FCT误差随quantum减小而减小
+    （竞争激烈的workload的完成时间对同时事件的先后很敏感，精确引擎中也是如此，需按workload检查）。
+    与精确引擎一致，流在传输完成后的传播时延内仍占用链路带宽。
+    只对占用链路的流（及其路径）保存压缩后的数组，只在它们变化时向量化地重算速率；
+    各步之间速率不变，直接跳到下一个有流/任务完成的步，步数与有完成的步数相同，与总时长无关。
+    每次重算速率有固定的numpy开销，小workload（如16 rank）上比精确引擎慢，大workload（如128 rank）上才更快。
+    结果（开始/结束时间、已发送量）写回simulator中的Flow/Task，开始/结束事件交给其订阅者（含轨迹）；
+    只能在添加完流和任务、尚未run的仿真器上调用；不支持动态选路，流使用添加时的初始路径
+    :return: {"steps": 步数, "rate_updates": 重算速率的次数, "wall_time": 墙钟耗时}
+    """
+    wall_start = time.perf_counter()
+    nodes = simulator.nodes
+    num_nodes = len(nodes)
+    is_flow = np.array([isinstance(obj, Flow) for obj in nodes], dtype=bool)
+    flow_nodes = np.nonzero(is_flow)[0]
+    flow_objs = [nodes[node] for node in flow_nodes.tolist()]
+    num_flows = len(flow_objs)
+    flow_position = np.full(num_nodes, -1, dtype=np.int64)
+    flow_position[flow_nodes] = np.arange(num_flows)
+
+    # 各流的路径（CSR）、链路容量（Mbps）
+    capacity = np.zeros(len(simulator.links))
+    for link in simulator.links.values():
+        capacity[link.index] = link.bandwidth * 1000   # Gbps转Mbps
+    path_offsets = _offsets([len(flow.path) for flow in flow_objs])
+    path_links = np.array([link.index for flow in flow_objs for link in flow.path], dtype=np.int64)
+    remaining = np.array([flow.size for flow in flow_objs], dtype=np.float64)
+    propagation = np.array([flow.propagation_delay for flow in flow_objs], dtype=np.float64)
+    compute_time = np.array([0 if is_flow[node] else nodes[node].compute_time for node in range(num_nodes)])
+
+    # 依赖图的后继（CSR）
+    successor_lists = [successors or [] for successors in simulator.successors]
+    successor_offsets = _offsets([len(successors) for successors in successor_lists])
+    successor_ids = np.array([node for successors in successor_lists for node in successors], dtype=np.int64)
+    pending = np.array(simulator.pending, dtype=np.int64)
+
+    start = np.full(num_nodes, np.nan)
+    end = np.full(num_nodes, np.inf)        # 已开始节点的完成时间（流在传输完成前未知）
+    started = np.zeros(num_nodes, dtype=bool)
+    done = np.zeros(num_nodes, dtype=bool)
+
+    # 压缩的活动集合：占用链路的流（下标为流的序号），其中transmitting为仍在传输的
+    occupying = np.zeros(0, dtype=np.int64)
+    transmitting = np.zeros(0, dtype=bool)
+    rates = np.zeros(0)
+    new_flows = []                  # 本步开始的流，步末并入活动集合
+    ends = []                       # 结束时间已知、尚未完成的节点 (完成时间, 节点)，堆
+    publish = simulator.publish if simulator.subscriptions else None
+
+    def start_nodes(ready, now):
+        start[ready] = now
+        started[ready] = True
+        tasks = ready[~is_flow[ready]]
+        end[tasks] = now + compute_time[tasks]
+        for node in tasks.tolist():
+            heapq.heappush(ends, (end[node], node))
+        new_flows.append(flow_position[ready[is_flow[ready]]])
+        if publish is not None:
+            for node in ready.tolist():
+                publish(ObjectEvent(FLOW_START if is_flow[node] else TASK_START, now, nodes[node]))
+
+    step = 0                        # 当前时刻为 step * quantum
+    steps = 0
+    rate_updates = 0
+    changed = True
+    start_nodes(np.nonzero(pending == 0)[0], 0.0)
+    while True:
+        now = step * quantum
+        if changed:
+            # 活动集合变化：并入新开始的流、移除已完成的流，只对这些流的路径重算速率
+            added = np.concatenate(new_flows) if new_flows else np.zeros(0, dtype=np.int64)
+            new_flows.clear()
+            keep = ~done[flow_nodes[occupying]]
+            occupying = np.concatenate((occupying[keep], added))
+            transmitting = np.concatenate((transmitting[keep], np.ones(len(added), dtype=bool)))
+            rates = _fluid_rates(simulator.rate_mode, occupying, path_offsets, path_links, capacity)
+            rate_updates += 1
+            changed = False
+
+        # 下一个完成时刻：传输中的流按当前速率传完再加传播时延，或已知的完成时间
+        moving = transmitting & (rates > 0)
+        sent_done = np.full(len(occupying), np.inf)     # 传输完成时刻
+        sent_done[moving] = now + remaining[occupying[moving]] * 8 / rates[moving]
+        finish = sent_done + propagation[occupying]
+        next_end = min(finish.min(initial=np.inf), ends[0][0] if ends else np.inf)
+        if next_end == np.inf:
+            if transmitting.any():
+                stalled = [flow_objs[i].flow_id for i in occupying[transmitting][:5].tolist()]
+                raise RuntimeError(f"流体模式停滞：传输中的流速率全为0（例如 {stalled}）")
+            break
+        # 速率在下一个完成之前不变，直接跳到它所在的步末
+        next_step = max(step + 1, int(np.ceil(next_end / quantum)))
+        step_end = next_step * quantum
+        steps += 1
+
+        # 一次性扣减所有传输中流的剩余数据量，本步内传完的按精确时刻计算完成时间，
+        # 之后只剩传播时延，不再受速率变化影响
+        finishing = moving & (sent_done <= step_end)
+        for i, node in zip(np.nonzero(finishing)[0].tolist(), flow_nodes[occupying[finishing]].tolist()):
+            end[node] = finish[i]
+            heapq.heappush(ends, (finish[i], node))
+        sent_flows = occupying[moving]
+        remaining[sent_flows] = np.maximum(remaining[sent_flows] - rates[moving] * (step_end - now) / 8, 0)
+        remaining[occupying[finishing]] = 0
+        transmitting &= ~finishing
+
+        completed = []
+        while ends and ends[0][0] <= step_end:
+            completed.append(heapq.heappop(ends)[1])
+        if completed:
+            completed = np.array(completed, dtype=np.int64)
+            done[completed] = True
+            changed = bool(is_flow[completed].any())
+            if publish is not None:
+                for node in completed.tolist():
+                    publish(ObjectEvent(FLOW_END if is_flow[node] else TASK_END, float(end[node]), nodes[node]))
+            # 步末统一释放依赖
+            counts = successor_offsets[completed + 1] - successor_offsets[completed]
+            positions = np.repeat(successor_offsets[completed] - np.cumsum(counts) + counts, counts) \
+                + np.arange(counts.sum())
+            np.subtract.at(pending, successor_ids[positions], 1)
+            released = np.unique(successor_ids[positions])
+            ready = released[(pending[released] == 0) & ~started[released]]
+            if len(ready):
+                start_nodes(ready, step_end)
+                changed = changed or bool(is_flow[ready].any())
+        step = next_step
+
+    # 写回结果
+    for node, obj in enumerate(nodes):
+        if started[node]:
+            obj.start_time = float(start[node])
+        if done[node]:
+            obj.end_time = float(end[node])
+    for i, flow in enumerate(flow_objs):
+        flow.remaining_size = float(remaining[i])
+        flow.bytes_sent = flow.size - flow.remaining_size
+    simulator.current_time = step * quantum
+    simulator.event_queue = []
+    simulator.cancelled_count = 0
+    simulator.flush_subscriptions()
+    if simulator.trace is not None:
+        simulator.trace.flush()
+    return {"steps": steps, "rate_updates": rate_updates, "wall_time": time.perf_counter() - wall_start}
+
+
+def _offsets(counts):
+    """各段长度 -> CSR偏移"""
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _fluid_rates(rate_mode, flows, path_offsets, path_links, capacity):
+    """
+    占用链路的流flows的速率（Mbps，与flows一一对应）。
+    只展开这些流的路径，链路重新编号为它们用到的链路，代价与全部流/链路数无关
+    """
+    counts = path_offsets[flows + 1] - path_offsets[flows]
+    positions = np.repeat(path_offsets[flows] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    flow_index = np.repeat(np.arange(len(flows)), counts)
+    used_links, link_index = np.unique(path_links[positions], return_inverse=True)
+    used_capacity = capacity[used_links]
+    if rate_mode == RATE_MAX_MIN:
+        return max_min_fair_rates(flow_index, link_index, used_capacity, len(flows))
+    if rate_mode != RATE_EQUAL_SHARE:
+        raise ValueError(f"流体模式不支持的速率分配模式: {rate_mode}")
+    # 均分：每条链路按占用它的流数均分带宽，流速率取路径上的最小值
+    share = used_capacity / np.bincount(link_index, minlength=len(used_links))
+    rates = np.full(len(flows), np.inf)
+    np.minimum.at(rates, flow_index, share[link_index])
+    rates[np.isinf(rates)] = 0
+    return rates
+
+
+def fluid_error(exact, approx):
+    """
+    近似结果相对精确引擎的误差（两个仿真器的流和任务需一一对应，例如用同一种子构建）
+    :return: 完成时间、流完成时间（FCT）和任务结束时间的误差
+    """
+    def end_times(simulator):
+        return np.array([obj.end_time if obj.end_time is not None else np.nan for obj in simulator.nodes])
+
+    exact_end, approx_end = end_times(exact), end_times(approx)
+    exact_makespan, approx_makespan = np.nanmax(exact_end), np.nanmax(approx_end)
+    exact_fct = exact.flow_stats()["fct"]
+    approx_fct = approx.flow_stats()["fct"]
+    fct_error = np.abs(approx_fct - exact_fct)
+    return {
+        "exact_makespan": float(exact_makespan),
+        "approx_makespan": float(approx_makespan),
+        "makespan_rel_error": float(abs(approx_makespan - exact_makespan) / exact_makespan) if exact_makespan else 0,
+        "end_time_mean_abs_error": float(np.nanmean(np.abs(approx_end - exact_end))),
+        "end_time_max_abs_error": float(np.nanmax(np.abs(approx_end - exact_end))),
+        "fct_mean_abs_error": float(np.nanmean(fct_error)),
+        "fct_mean_rel_error": float(abs(np.nanmean(approx_fct) - np.nanmean(exact_fct)) / np.nanmean(exact_fct)),
+        "unfinished_mismatch": int(np.sum(np.isnan(exact_end) != np.isnan(approx_end))),
+    }
+
+
+if __name__ == "__main__":
+    from benchmark import HOSTS_PER_RACK
+    from Topology import Topology
+    from sweep import DEFAULT_WORKLOAD
+    from topo_builder import build_clos, set_16_rank_topo
+    from workload import load_workload, add_workload_to_simulator
+
+    parser = argparse.ArgumentParser(description="流体模式与精确引擎的对比")
+    parser.add_argument("num", type=int)
+    parser.add_argument("bandwidth", type=int)
+    parser.add_argument("--quantum", type=float, nargs="+", default=[1e-3, 1e-4], help="时间步长（秒）")
+    parser.add_argument("--rate-mode", default=RATE_EQUAL_SHARE)
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workload = load_workload(args.workload)
+    # 超过16个rank的workload（例如workload_gen生成的）使用每rack 8个host的两级leaf-spine拓扑，
+    # num、bandwidth为每对leaf-spine之间的并行链路数和链路带宽（对应16-rank拓扑的core链路）
+    ranks = int(max(workload.src_rank.max(), workload.dst_rank.max())) + 1
+    if ranks > 16:
+        racks = -(-ranks // HOSTS_PER_RACK)
+
+        def build_topo(simulator, topo):
+            build_clos(simulator, topo, racks, HOSTS_PER_RACK, leaf_uplinks=args.num, leaf_bandwidth=args.bandwidth)
+    else:
+        def build_topo(simulator, topo):
+            set_16_rank_topo(simulator, topo, args.num, args.bandwidth, 2)
+    topo = Topology()
+    build_topo(None, topo)
+
+    def build():
+        simulator = Simulator("fluid", trace=False, rate_mode=args.rate_mode)
+        build_topo(simulator, None)
+        add_workload_to_simulator(workload, simulator, topo, random.Random(args.seed))
+        return simulator
+
+    exact = build()
+    start = time.perf_counter()
+    exact.run()
+    exact_wall = time.perf_counter() - start
+    print(f"exact: makespan {max(obj.end_time for obj in exact.nodes if obj.end_time is not None):.6f}s, "
+          f"wall {exact_wall:.3f}s")
+    for quantum in args.quantum:
+        approx = build()
+        result = run_fluid(approx, quantum)
+        error = fluid_error(exact, approx)
+        print(f"fluid quantum {quantum}: makespan {error['approx_makespan']:.6f}s "
+              f"(error {error['makespan_rel_error'] * 100:.2f}%), "
+              f"fct mean error {error['fct_mean_rel_error'] * 100:.2f}%, "
+              f"steps {result['steps']}, rate updates {result['rate_updates']}, wall {result['wall_time']:.3f}s "
+              f"({exact_wall / result['wall_time']:.2f}x the exact engine)")
+        if result["wall_time"] >= exact_wall:
+            print("  fluid mode is not faster than the exact engine on this workload "
+                  "(it only pays off on large workloads, e.g. 128 ranks)")
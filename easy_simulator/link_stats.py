@@ -0,0 +1,117 @@
+import numpy as np
+
+# 利用率直方图的分桶数：[0, 1) 等分为HISTOGRAM_BINS个桶，利用率 >= 1 计入最后一个桶
+HISTOGRAM_BINS = 100
+
+
+class LinkUtilStats:
+    """
+    链路利用率的在线统计：每次链路负载变化时，把上一段的利用率按持续时间累加，
+    内存只与链路数成正比，不需要写出逐事件的link_util轨迹
+    """
+    def __init__(self):
+        self.bandwidths = []    # link_index -> 带宽（Gbps）
+        self.roles = []         # link_index -> 链路角色（见topo_builder），未知为""
+        self.last_time = []     # link_index -> 上次负载变化的时间
+        self.util = []          # link_index -> 当前利用率
+        self.util_time = []     # link_index -> 利用率对时间的积分
+        self.idle_time = []     # link_index -> 空闲（利用率为0）的总时长
+        self.peak = []          # link_index -> 峰值利用率
+        self.histogram = []     # link_index -> 各利用率桶的累计时长
+
+    def register(self, bandwidth, role=None):
+        """登记链路，返回其整数id（与Simulator/TraceWriter中的链路id一致）"""
+        self.bandwidths.append(bandwidth)
+        self.roles.append(role or "")
+        self.last_time.append(0)
+        self.util.append(0)
+        self.util_time.append(0)
+        self.idle_time.append(0)
+        self.peak.append(0)
+        self.histogram.append([0] * (HISTOGRAM_BINS + 1))
+        return len(self.bandwidths) - 1
+
+    def update(self, link_index, time, load):
+        """链路在time时刻负载变为load（Gbps）"""
+        self._advance(link_index, time)
+        util = load / self.bandwidths[link_index]
+        self.util[link_index] = util
+        if util > self.peak[link_index]:
+            self.peak[link_index] = util
+
+    def _advance(self, link_index, time):
+        """把上次变化到time之间的利用率计入统计（时间倒退时不重复计入）"""
+        duration = time - self.last_time[link_index]
+        if duration <= 0:
+            return
+        util = self.util[link_index]
+        self.util_time[link_index] += util * duration
+        if util <= 0:
+            self.idle_time[link_index] += duration
+        self.histogram[link_index][min(max(int(util * HISTOGRAM_BINS), 0), HISTOGRAM_BINS)] += duration
+        self.last_time[link_index] = time
+
+    def state(self):
+        return {name: [list(row) for row in value] if name == "histogram" else list(value)
+                for name, value in vars(self).items()}
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls()
+        for name, value in state.items():
+            setattr(stats, name, [list(row) for row in value] if name == "histogram" else list(value))
+        return stats
+
+    def report(self, end_time=None, percentiles=(50, 90, 99)):
+        """
+        [0, end_time] 内的时间加权统计（不改变统计状态），end_time默认为最后一次负载变化的时间
+        :return: (逐链路统计, 逐角色统计)
+                 逐链路统计为 {列名: 数组}（下标为链路id），逐角色统计为 {角色: {列名: 值}}
+                 列为 mean_util、peak_util、idle_fraction、busy_bytes（MB）和 p{q}_util，
+                 分位数的精度为 1/HISTOGRAM_BINS
+        """
+        if end_time is None:
+            end_time = max(self.last_time, default=0)
+        last_time = np.array(self.last_time, dtype=np.float64)
+        util = np.array(self.util, dtype=np.float64)
+        # 补上最后一次变化到end_time的一段
+        tail = np.maximum(end_time - last_time, 0)
+        util_time = np.array(self.util_time, dtype=np.float64) + util * tail
+        idle_time = np.array(self.idle_time, dtype=np.float64) + np.where(util <= 0, tail, 0)
+        histogram = np.array(self.histogram, dtype=np.float64).reshape(len(util), HISTOGRAM_BINS + 1)
+        bins = np.clip((util * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS)
+        histogram[np.arange(len(util)), bins] += tail
+        peak = np.array(self.peak, dtype=np.float64)
+        bandwidths = np.array(self.bandwidths, dtype=np.float64)
+
+        per_link = _summarize(util_time, idle_time, histogram, peak, end_time, percentiles)
+        per_link["busy_bytes"] = util_time * bandwidths * 1000 / 8     # Gb转MB
+
+        roles = np.array(self.roles, dtype=str)
+        per_role = {}
+        for role in dict.fromkeys(self.roles):
+            selected = roles == role
+            count = int(selected.sum())
+            summary = _summarize(util_time[selected].sum(keepdims=True), idle_time[selected].sum(keepdims=True),
+                                 histogram[selected].sum(axis=0, keepdims=True), peak[selected].max(keepdims=True),
+                                 end_time * count, percentiles)
+            summary = {name: value.item() for name, value in summary.items()}
+            summary["busy_bytes"] = per_link["busy_bytes"][selected].sum().item()
+            summary["link_num"] = count
+            per_role[role] = summary
+        return per_link, per_role
+
+
+def _summarize(util_time, idle_time, histogram, peak, duration, percentiles):
+    """由累计量计算平均、峰值、空闲比例和分位数（duration为统计的总链路时长）"""
+    summary = {
+        "mean_util": util_time / duration if duration else np.zeros(len(util_time)),
+        "peak_util": peak,
+        "idle_fraction": idle_time / duration if duration else np.zeros(len(util_time)),
+    }
+    cumulative = np.cumsum(histogram, axis=1)
+    total = cumulative[:, -1:]
+    for q in percentiles:
+        bins = np.argmax(cumulative >= total * q / 100, axis=1)
+        summary[f"p{q}_util"] = np.where(total[:, 0] > 0, bins / HISTOGRAM_BINS, 0)
+    return summary
@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+# 可订阅的事件类型
+FLOW_START = "flow_start"
+FLOW_END = "flow_end"
+TASK_START = "task_start"
+TASK_END = "task_end"
+RATE_CHANGE = "rate_change"
+LINK_LOAD = "link_load"
+LINK_UTIL = "link_util"
+OBJECT_EVENTS = (FLOW_START, FLOW_END, TASK_START, TASK_END)
+ALL_EVENTS = OBJECT_EVENTS + (RATE_CHANGE, LINK_LOAD, LINK_UTIL)
+
+# 流/任务开始或结束：obj为Flow/Task对象本身（名称、路径、大小等直接从对象读取）
+ObjectEvent = namedtuple("ObjectEvent", ["event", "time", "obj"])
+# 一批数值变化：rate_change为 [(Flow, 速率Gbps), ...]，link_load/link_util为 [(Link, 负载Gbps/利用率), ...]
+ValuesEvent = namedtuple("ValuesEvent", ["event", "time", "values"])
+
+
+class Subscription:
+    """一个订阅：batch_size为None时每条记录调用一次callback(record)，否则攒够batch_size条调用callback(records)"""
+    __slots__ = ('callback', 'events', 'batch_size', 'buffer')
+
+    def __init__(self, callback, events, batch_size=None):
+        self.callback = callback
+        self.events = events
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def deliver(self, record):
+        if self.batch_size is None:
+            self.callback(record)
+            return
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把攒下的记录交给callback（批量订阅时在run结束和close时自动调用）"""
+        if self.buffer:
+            records, self.buffer = self.buffer, []
+            self.callback(records)
@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+import time
+import warnings
+
+from router import ROUTING_POWER_OF_TWO
+from simulator import Simulator, Flow
+from observer import FLOW_START, FLOW_END, TASK_START, TASK_END, ObjectEvent
+
+# 逐链路的利用率统计项（见LinkUtilStats），合并各分区结果时按链路拷贝
+_LINK_STATS_FIELDS = ("last_time", "util", "util_time", "idle_time", "peak", "histogram")
+# 依赖不在仿真器中的节点（永远不会开始）在分区中等待的名称
+_UNRESOLVED = "\0unresolved"
+
+# fork出的worker共享的（父进程中建好的）仿真器
+_shared_simulator = None
+
+
+def flow_links(simulator, flow):
+    """流可能使用的链路：固定路径，或动态选路时的全部候选链路"""
+    router = simulator.router
+    if flow.route is None or router is None:
+        return flow.path
+    return [router.links[link_id] for groups in router.topo.ecmp(*flow.route).hop_groups
+            for group in groups for link_id in group]
+
+
+def independent_partitions(simulator):
+    """
+    把依赖图和链路共享图的连通分量作为互不影响的分区：不同分区的流不共用任何链路、
+    节点之间没有依赖，各自单独仿真的结果与整体仿真完全相同
+    :return: 分区列表（各分区的节点id列表，升序），按节点数从大到小排列
+    """
+    nodes = simulator.nodes
+    parent = list(range(len(nodes)))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    for node, successors in enumerate(simulator.successors):
+        for successor in successors or ():
+            union(node, successor)
+    link_owner = {}             # 链路 -> 最先使用它的节点
+    for node, obj in enumerate(nodes):
+        if isinstance(obj, Flow):
+            for link in flow_links(simulator, obj):
+                owner = link_owner.setdefault(link, node)
+                if owner != node:
+                    union(owner, node)
+
+    partitions = {}
+    for node in range(len(nodes)):
+        partitions.setdefault(find(node), []).append(node)
+    return sorted(partitions.values(), key=len, reverse=True)
+
+
+def _assign(partitions, workers):
+    """按节点数贪心（最大的先放）把分区分给负载最轻的worker，返回各worker的节点id列表（升序）"""
+    bins = [[] for _ in range(min(workers, len(partitions)))]
+    sizes = [0] * len(bins)
+    for partition in partitions:
+        i = sizes.index(min(sizes))
+        bins[i].extend(partition)
+        sizes[i] += len(partition)
+    return [sorted(nodes) for nodes in bins]
+
+
+def _run_nodes(node_ids):
+    """在worker中只仿真node_ids中的节点（若干完整的分区），返回逐节点结果和用到的链路的统计"""
+    simulator = _shared_simulator
+    link_names = {id(link): link_name for link_name, link in simulator.links.items()}
+    sub = Simulator(simulator.file_name, trace=False, rate_mode=simulator.rate_mode,
+                    time_epsilon=simulator.time_epsilon)
+    for link_name, link in simulator.links.items():
+        sub.add_link(link_name, link.bandwidth, link.delay, simulator.link_stats.roles[link.index])
+    if simulator.router is not None:
+        router = simulator.router
+        sub.router = type(router)(router.mode, router.topo, sub.links, router.rng, router.flowlet_gap)
+
+    position = {node: i for i, node in enumerate(node_ids)}
+    predecessors = {node: [] for node in node_ids}
+    for node in node_ids:
+        for successor in simulator.successors[node] or ():
+            predecessors[successor].append(position[node])
+    for node in node_ids:
+        obj = simulator.nodes[node]
+        dependency = predecessors[node]
+        if simulator.pending[node] > len(dependency):
+            dependency.append(_UNRESOLVED)
+        if isinstance(obj, Flow):
+            sub.add_flow(obj.flow_id, obj.size, [sub.links[link_names[id(link)]] for link in obj.path],
+                         dependency=dependency, route=obj.route)
+        else:
+            sub.add_task(obj.task_id, obj.compute_time, dependency=dependency)
+    sub.run()
+
+    results = []
+    for obj in sub.nodes:
+        if isinstance(obj, Flow):
+            results.append((obj.start_time, obj.end_time, (obj.bytes_sent, obj.remaining_size,
+                                                           [link.index for link in obj.path])))
+        else:
+            results.append((obj.start_time, obj.end_time, None))
+    used_links = {link.index for obj in sub.nodes if isinstance(obj, Flow) for link in flow_links(sub, obj)}
+    stats = sub.link_stats
+    link_stats = {index: tuple(getattr(stats, field)[index] for field in _LINK_STATS_FIELDS) for index in used_links}
+    return results, link_stats
+
+
+def run_parallel(simulator, workers=None):
+    """
+    独立作业并行（不是按rack/pod分区、窗口同步的并行引擎）：
+    把尚未run的仿真器按independent_partitions分区，在多个进程中并行仿真，结果写回simulator：
+    流/任务的开始、结束时间、已发送量和（动态选路时的）路径，链路利用率统计，开始/结束事件按时间顺序交给订阅者
+    （不产生链路负载、利用率和速率变化事件）。
+    速率分配在共用链路的流之间是瞬时耦合的，链路时延不构成前瞻量，因此只在互不相连的分区
+    （例如互不共用链路的多个作业）之间并行；整个workload连成一个分区时（例如DP all-reduce经过core的
+    单个训练作业）退化为顺序执行，并给出RuntimeWarning。
+    不支持time_epsilon > 0（不同分区同一时间窗内的事件会被合并处理）和power_of_two选路（共用随机数流）
+    :return: {"partitions": 分区数, "workers": 进程数, "wall_time": 墙钟耗时}
+    """
+    global _shared_simulator
+    if simulator.time_epsilon:
+        raise ValueError("并行仿真要求time_epsilon为0")
+    if simulator.router is not None and simulator.router.mode == ROUTING_POWER_OF_TWO:
+        raise ValueError("并行仿真不支持power_of_two选路")
+    if any(obj.start_time is not None for obj in simulator.nodes):
+        raise ValueError("只能对尚未run的仿真器并行仿真")
+    start = time.perf_counter()
+    partitions = independent_partitions(simulator)
+    requested = workers or os.cpu_count() or 1
+    workers = min(requested, len(partitions))
+    if len(partitions) == 1 and requested > 1:
+        warnings.warn("workload只有一个互不相连的分区（各作业共用链路或有依赖），退化为顺序执行",
+                      RuntimeWarning, stacklevel=2)
+    if workers <= 1:
+        simulator.run()
+        return {"partitions": len(partitions), "workers": 1, "wall_time": time.perf_counter() - start}
+
+    bins = _assign(partitions, workers)
+    _shared_simulator = simulator
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    try:
+        with context.Pool(workers) as pool:
+            outputs = pool.map(_run_nodes, bins, chunksize=1)
+    finally:
+        _shared_simulator = None
+
+    # 写回结果
+    link_list = sorted(simulator.links.values(), key=lambda link: link.index)
+    records = []
+    for node_ids, (results, link_stats) in zip(bins, outputs):
+        for node, (start_time, end_time, flow_result) in zip(node_ids, results):
+            obj = simulator.nodes[node]
+            obj.start_time = start_time
+            obj.end_time = end_time
+            is_flow = flow_result is not None
+            if is_flow:
+                obj.bytes_sent, obj.remaining_size, path = flow_result
+                obj.set_path([link_list[index] for index in path])
+            if start_time is not None:
+                records.append(ObjectEvent(FLOW_START if is_flow else TASK_START, start_time, obj))
+            if end_time is not None:
+                records.append(ObjectEvent(FLOW_END if is_flow else TASK_END, end_time, obj))
+        for index, values in link_stats.items():
+            for field, value in zip(_LINK_STATS_FIELDS, values):
+                getattr(simulator.link_stats, field)[index] = value
+    records.sort(key=lambda record: record.time)
+    if simulator.subscriptions:
+        for record in records:
+            simulator.publish(record)
+    simulator.current_time = max((record.time for record in records), default=0)
+    simulator.event_queue = []
+    simulator.cancelled_count = 0
+    simulator.flush_subscriptions()
+    if simulator.trace is not None:
+        simulator.trace.flush()
+    return {"partitions": len(partitions), "workers": len(bins), "wall_time": time.perf_counter() - start}
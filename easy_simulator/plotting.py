@@ -0,0 +1,184 @@
+import argparse
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from topo_builder import CORE_ROLE_PREFIX
+from trace_reader import LinkTraceIndex, load_meta, load_flow_stats
+from trace_writer import STREAM_LINK_LOAD, STREAM_LINK_UTIL
+
+FIGSIZE = (10, 6)
+DPI = 100
+PLOT_WIDTH = FIGSIZE[0] * DPI   # 横轴像素数，降采样时每个像素列为一个桶
+LEGEND_MAX = 20                 # 序列数超过该值时不画图例（数百条链路的图例不可读）
+DP_FLOW_MARKER = "F999"         # 名称中带该标记的流为DP all-reduce，其余为PP/TP
+
+
+def step_vertices(times, values):
+    """
+    阶梯序列按steps-pre展开为折线顶点：(t0, v0), (t0, v1), (t1, v1), (t1, v2), ...，
+    之后可以和普通折线一样降采样、用LineCollection绘制。
+    链路负载/利用率记录在事件处理之前写出，time[i]记录的是上一批次以来生效的值，
+    因此v[i]画在 (t[i-1], t[i]] 上，而不是之后
+    """
+    if len(times) < 2:
+        return times, values
+    order = np.argsort(times, kind="stable")   # 时间可能倒退，按时间排好（同一时刻保持记录顺序）
+    times, values = times[order], values[order]
+    return np.repeat(times, 2)[:-1], np.repeat(values, 2)[1:]
+
+
+def m4_downsample(x, y, x_min, x_max, buckets=PLOT_WIDTH):
+    """
+    保形降采样（M4）：横轴按像素列分为buckets个桶，每个桶只保留第一个、最后一个、最小值和最大值点，
+    按像素绘制的折线与使用全部点时一致。x须升序
+    :return: (x, y) 保留点，按原顺序
+    """
+    if len(x) <= 4 * buckets or x_max <= x_min:
+        return x, y
+    bucket = np.clip(((x - x_min) / (x_max - x_min) * buckets).astype(np.int64), 0, buckets - 1)
+    firsts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    lasts = np.concatenate((firsts[1:], [len(x)])) - 1
+    # 桶内按值排序后，每个桶的首/尾即最小/最大值点
+    order = np.lexsort((y, bucket))
+    keep = np.unique(np.concatenate((firsts, lasts, order[firsts], order[lasts])))
+    return x[keep], y[keep]
+
+
+def _time_range(series):
+    """所有序列的 (最早时间, 最晚时间)，没有数据时为 (0, 1)"""
+    starts = [times[0] for times, _ in series if len(times)]
+    if not starts:
+        return 0.0, 1.0
+    return min(starts), max(times[-1] for times, _ in series if len(times))
+
+
+def plot_step_series(series, header, title, ylabel, output, buckets=PLOT_WIDTH):
+    """
+    把多条阶梯序列降采样后画在一张图上（一个LineCollection，而不是每条序列一次plt.plot）
+    :param series: {名称: (时间数组, 数值数组)}
+    """
+    vertices = [step_vertices(times, values) for times, values in series.values()]
+    t_min, t_max = _time_range(vertices)
+    segments = []
+    for times, values in vertices:
+        times, values = m4_downsample(times, values, t_min, t_max, buckets)
+        segments.append(np.column_stack((times, values)))
+    colors = plt.get_cmap("tab20").colors
+    colors = [colors[i % len(colors)] for i in range(len(segments))]
+
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=1))
+    ax.autoscale()
+    ax.set_title(f"{header} {title}")
+    ax.set_xlabel("time (s)")
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    if len(segments) <= LEGEND_MAX:
+        ax.legend([Line2D([], [], color=color) for color in colors], list(series))
+    fig.savefig(output)
+    plt.close(fig)
+    return sum(len(segment) for segment in segments)
+
+
+def average_util_by_role(util_index, roles):
+    """
+    各角色链路在各时刻的平均利用率
+    :return: {角色: (时间数组, 平均利用率数组)}
+    """
+    return {role: util_index.mean_over_links(util_index.links_with_role(lambda link_role: link_role == role))
+            for role in roles}
+
+
+def non_zero_average(values):
+    """不为0的点的平均值（全为0时为0）"""
+    non_zero = values[values != 0]
+    return non_zero.mean() if len(non_zero) else 0
+
+
+def pixel_dedup(x, y, x_range, y_range, size=(PLOT_WIDTH, FIGSIZE[1] * DPI)):
+    """散点降采样：落在同一像素上的点只保留一个"""
+    if not len(x):
+        return x, y
+    spans = [max(high - low, 1e-12) for low, high in (x_range, y_range)]
+    pixel_x = ((x - x_range[0]) / spans[0] * (size[0] - 1)).astype(np.int64)
+    pixel_y = ((y - y_range[0]) / spans[1] * (size[1] - 1)).astype(np.int64)
+    _, keep = np.unique(pixel_x * size[1] + pixel_y, return_index=True)
+    keep.sort()
+    return x[keep], y[keep]
+
+
+def plot_fct_scatter(flow_names, flow_stats, header, output):
+    """
+    流完成时间散点图：横轴为结束时间，纵轴为FCT，按DP all-reduce / 其余流着色；
+    每类按像素去重后再画
+    """
+    end_time = flow_stats["end_time"]
+    fct = flow_stats["fct"]
+    finished = ~np.isnan(end_time)
+    is_dp = np.array([DP_FLOW_MARKER in name for name in flow_names], dtype=bool)
+    x_range = (np.min(end_time[finished], initial=0), np.max(end_time[finished], initial=1))
+    y_range = (np.min(fct[finished], initial=0), np.max(fct[finished], initial=1))
+
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+    drawn = 0
+    for mask, color, label in ((finished & is_dp, "blue", "DP"), (finished & ~is_dp, "red", "PP")):
+        x, y = pixel_dedup(end_time[mask], fct[mask], x_range, y_range)
+        ax.scatter(x, y, s=4, color=color, label=f"{label} ({np.count_nonzero(mask)})")
+        drawn += len(x)
+    ax.set_title(f"{header} Flow Completion Time")
+    ax.set_xlabel("finish time (s)")
+    ax.set_ylabel("FCT (s)")
+    ax.grid(True)
+    ax.legend()
+    fig.savefig(output)
+    plt.close(fig)
+    return drawn
+
+
+def plot_trace(trace_dir, header, buckets=PLOT_WIDTH):
+    """
+    一次读入轨迹的各个流（负载、利用率、逐流统计各读一遍并建索引），画出全部图：
+    core链路负载、利用率、各方向core链路的平均利用率、流完成时间散点图
+    :return: {"core_util": {角色: 不为0的点的平均利用率}, "points": {图: 实际绘制的点数}}
+    """
+    load_index = LinkTraceIndex.from_trace(trace_dir, STREAM_LINK_LOAD)
+    util_index = LinkTraceIndex.from_trace(trace_dir, STREAM_LINK_UTIL)
+    is_core = lambda role: role.startswith(CORE_ROLE_PREFIX)
+    core_links = util_index.links_with_role(is_core)
+    core_roles = sorted({role for role in util_index.link_roles if is_core(role)})
+
+    points = {}
+    points["link_load"] = plot_step_series({link: load_index.series(link) for link in core_links}, header,
+                                           "Link Bandwidth Load", "load(Gbps)", f"{header}_link_load.png", buckets)
+    points["link_util"] = plot_step_series({link: util_index.series(link) for link in core_links}, header,
+                                           "Link Bandwidth Util", "util", f"{header}_link_util.png", buckets)
+    average = average_util_by_role(util_index, core_roles)
+    points["average_link_util"] = plot_step_series(average, header, "Average Link Utilization", "average util",
+                                                   f"{header}_average_link_util.png", buckets)
+    flow_stats = load_flow_stats(trace_dir)
+    if flow_stats:
+        points["scatter_plot"] = plot_fct_scatter(load_meta(trace_dir)["flow_names"].tolist(), flow_stats,
+                                                  header, f"{header}_scatter_plot.png")
+    return {"core_util": {role: non_zero_average(values) for role, (_, values) in average.items()},
+            "points": points}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从轨迹目录画出链路负载/利用率、平均core利用率和FCT散点图（降采样）")
+    parser.add_argument("num", type=int)
+    parser.add_argument("bandwidth", type=int)
+    parser.add_argument("--delay", type=int, default=2)
+    parser.add_argument("--width", type=int, default=PLOT_WIDTH, help="降采样的像素列数")
+    args = parser.parse_args()
+
+    file_name = f"link_num_{args.num}_bandwidth_{args.bandwidth}_delay_{args.delay}"
+    result = plot_trace(f"{file_name}_trace", file_name, args.width)
+    print(f"Num: {args.num}, Bandwidth: {args.bandwidth}")
+    for role, util in result["core_util"].items():
+        print(f"{role} average util: {util * 100:.2f}%")
+    print("points drawn: " + ", ".join(f"{name} {count}" for name, count in result["points"].items()))
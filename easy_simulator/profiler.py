@@ -0,0 +1,158 @@
+import sys
+import time
+from collections import Counter
+
+# 计时项
+TIMER_RUN = "run"                       # Simulator.run 总耗时
+TIMER_RATE_UPDATE = "rate_update"       # update_flow_rates（含速率求解、重新调度、速率记录）
+TIMER_RATE_SOLVE = "rate_solve"         # 速率分配引擎求解
+TIMER_LOGGING = "logging"               # 轨迹记录（事件、链路负载/利用率、速率、写盘）
+TIMER_DEPENDENCY = "dependency_release"  # 释放依赖事件
+
+
+class EventLoopProfiler:
+    """
+    事件循环的计数和计时。attach时把仿真器（及其速率分配引擎、轨迹写出器）的相关方法
+    替换为带统计的包装，未attach的仿真器不执行任何统计代码
+    """
+    def __init__(self, progress_interval=None, progress_file=None):
+        """
+        :param progress_interval: 每隔多少秒（墙钟时间）输出一行进度，None表示不输出
+        :param progress_file: 进度输出位置，默认stderr
+        """
+        self.progress_interval = progress_interval
+        self.progress_file = progress_file
+        self.events = Counter()         # 事件类型 -> 处理数
+        self.batches = 0                # 事件批次数
+        self.cancellations = 0          # 取消的事件数
+        self.heap_high_water = 0        # 事件堆大小的峰值（含墓碑事件）
+        self.rate_updates = 0           # 速率求解次数
+        self.flows_touched = 0          # 各次速率求解涉及的流数之和
+        self.max_flows_touched = 0      # 单次速率求解涉及的最大流数
+        self.timers = Counter()         # 计时项 -> 累计秒数
+        self.simulator = None
+        self._next_progress = None
+        self._run_start = None          # 当前run的开始时间（墙钟），不在run中时为None
+
+    def attach(self, simulator):
+        """在simulator上启用统计，返回self"""
+        self.simulator = simulator
+        simulator.profiler = self
+        self._next_progress = None if self.progress_interval is None else time.perf_counter() + self.progress_interval
+
+        handle_event = simulator.handle_event
+        schedule_event = simulator.schedule_event
+        cancel_event = simulator.cancel_event
+        process_batch = simulator.process_batch
+        allocate = simulator.rate_allocator.allocate
+        run = simulator.run
+
+        def timed_run(*args, **kwargs):
+            self._run_start = time.perf_counter()
+            try:
+                return run(*args, **kwargs)
+            finally:
+                self.timers[TIMER_RUN] += time.perf_counter() - self._run_start
+                self._run_start = None
+
+        def counted_handle_event(event):
+            self.events[event.event_type] += 1
+            handle_event(event)
+
+        def counted_schedule_event(event):
+            schedule_event(event)
+            if len(simulator.event_queue) > self.heap_high_water:
+                self.heap_high_water = len(simulator.event_queue)
+
+        def counted_cancel_event(event):
+            if not event.cancelled:
+                self.cancellations += 1
+            cancel_event(event)
+
+        def counted_process_batch(event):
+            self.batches += 1
+            process_batch(event)
+            if self._next_progress is not None and time.perf_counter() >= self._next_progress:
+                self._next_progress = time.perf_counter() + self.progress_interval
+                self.print_progress()
+
+        def counted_allocate(affected_links):
+            start = time.perf_counter()
+            rates = allocate(affected_links)
+            self.timers[TIMER_RATE_SOLVE] += time.perf_counter() - start
+            self.rate_updates += 1
+            self.flows_touched += len(rates)
+            if len(rates) > self.max_flows_touched:
+                self.max_flows_touched = len(rates)
+            return rates
+
+        simulator.handle_event = counted_handle_event
+        simulator.schedule_event = counted_schedule_event
+        simulator.cancel_event = counted_cancel_event
+        simulator.process_batch = counted_process_batch
+        simulator.rate_allocator.allocate = counted_allocate
+        simulator.run = timed_run
+        self._time(simulator, "update_flow_rates", TIMER_RATE_UPDATE)
+        self._time(simulator, "release_dependents", TIMER_DEPENDENCY)
+        for name in ("record_link_load", "record_link_util"):
+            self._time(simulator, name, TIMER_LOGGING)
+        if simulator.trace is not None:
+            for name in ("record_event", "record_rates", "flush"):
+                self._time(simulator.trace, name, TIMER_LOGGING)
+        return self
+
+    def _time(self, obj, name, timer):
+        """把obj.name替换为累计耗时到timer的包装"""
+        method = getattr(obj, name)
+        timers = self.timers
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timers[timer] += time.perf_counter() - start
+
+        setattr(obj, name, timed)
+
+    def report(self):
+        """统计结果（dict）"""
+        event_num = sum(self.events.values())
+        run_time = self.timers[TIMER_RUN]
+        return {
+            "events": event_num,
+            "events_by_type": dict(self.events),
+            "events_per_sec": event_num / run_time if run_time else 0,
+            "batches": self.batches,
+            "cancellations": self.cancellations,
+            "heap_high_water": self.heap_high_water,
+            "rate_updates": self.rate_updates,
+            "flows_per_rate_update": self.flows_touched / self.rate_updates if self.rate_updates else 0,
+            "max_flows_per_rate_update": self.max_flows_touched,
+            "timers": dict(self.timers),
+        }
+
+    def print_progress(self):
+        """输出一行进度：仿真时间、已处理事件数、事件处理速率、事件堆大小"""
+        simulator = self.simulator
+        event_num = sum(self.events.values())
+        elapsed = self.timers[TIMER_RUN]
+        if self._run_start is not None:
+            elapsed += time.perf_counter() - self._run_start
+        rate = event_num / elapsed if elapsed else 0
+        print(f"[sim {simulator.current_time:.6f}s] events: {event_num}, {rate:.0f} events/s, "
+              f"heap: {len(simulator.event_queue)}, cancelled: {simulator.cancelled_count}",
+              file=self.progress_file or sys.stderr, flush=True)
+
+    def format_report(self):
+        """统计结果的可读文本"""
+        report = self.report()
+        lines = [f"events: {report['events']} ({report['events_per_sec']:.0f} events/s), "
+                 f"batches: {report['batches']}, heap high water: {report['heap_high_water']}, "
+                 f"cancellations: {report['cancellations']}"]
+        lines.append("events by type: " + ", ".join(f"{event_type}: {count}"
+                                                     for event_type, count in sorted(self.events.items())))
+        lines.append(f"rate updates: {report['rate_updates']}, flows per update: "
+                     f"{report['flows_per_rate_update']:.1f} (max {report['max_flows_per_rate_update']})")
+        lines.append("time: " + ", ".join(f"{timer} {seconds:.3f}s" for timer, seconds in self.timers.items()))
+        return "\n".join(lines)
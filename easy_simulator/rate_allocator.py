@@ -0,0 +1,99 @@
+import numpy as np
+
+RATE_EQUAL_SHARE = "equal_share"
+RATE_MAX_MIN = "max_min"
+
+
+def coupled_flows(affected_links):
+    """
+    找出与受影响链路耦合的所有流（流-链路二部图上的连通分量）
+    :return: (流列表, 链路列表)，均保持发现顺序
+    """
+    links = dict.fromkeys(affected_links)
+    flows = {}
+    stack = list(links)
+    while stack:
+        link = stack.pop()
+        for flow in link.active_flows:
+            if flow in flows:
+                continue
+            flows[flow] = None
+            for path_link in flow.path:
+                if path_link not in links:
+                    links[path_link] = None
+                    stack.append(path_link)
+    return list(flows), list(links)
+
+
+def max_min_fair_rates(flow_index, link_index, capacity, num_flows):
+    """
+    渐进填充（water-filling）求最大最小公平速率
+    :param flow_index: 关联矩阵非零元的流下标（COO格式）
+    :param link_index: 关联矩阵非零元的链路下标
+    :param capacity: 各链路容量
+    :param num_flows: 流数量
+    :return: 各流速率（与capacity单位相同）
+    """
+    rates = np.zeros(num_flows)
+    active = np.ones(num_flows, dtype=bool)
+    remaining = capacity.astype(np.float64)
+    tolerance = capacity * 1e-9
+    while active.any():
+        on_active = active[flow_index]
+        counts = np.bincount(link_index[on_active], minlength=len(capacity))
+        used = counts > 0
+        if not used.any():
+            break
+        # 所有未冻结的流同步增速，直到某条链路被占满
+        increment = np.min(remaining[used] / counts[used])
+        rates[active] += increment
+        remaining -= increment * counts
+        # 冻结经过饱和链路的流
+        saturated = used & (remaining <= tolerance)
+        active[flow_index[on_active & saturated[link_index]]] = False
+    return rates
+
+
+class EqualShareAllocator:
+    """原有模式：流速率取路径上各链路带宽均分值的最小值"""
+    def allocate(self, affected_links):
+        """:return: [(flow, 速率Mbps), ...]"""
+        flows = {}
+        for link in affected_links:
+            for flow in link.active_flows:
+                if flow not in flows:
+                    flows[flow] = flow.bottleneck_rate()
+        return list(flows.items())
+
+
+class MaxMinFairAllocator:
+    """最大最小公平分配，只重新求解与变化链路耦合的连通分量"""
+    def allocate(self, affected_links):
+        """:return: [(flow, 速率Mbps), ...]"""
+        flows, links = coupled_flows(affected_links)
+        if not flows:
+            return []
+        link_position = {link: i for i, link in enumerate(links)}
+        flow_index = []
+        link_index = []
+        for i, flow in enumerate(flows):
+            for link in flow.path:
+                flow_index.append(i)
+                link_index.append(link_position[link])
+        capacity = np.array([link.bandwidth * 1000 for link in links], dtype=np.float64)  # Gbps转Mbps
+        rates = max_min_fair_rates(np.array(flow_index, dtype=np.int64),
+                                   np.array(link_index, dtype=np.int64),
+                                   capacity, len(flows))
+        return list(zip(flows, rates.tolist()))
+
+
+RATE_ALLOCATORS = {
+    RATE_EQUAL_SHARE: EqualShareAllocator,
+    RATE_MAX_MIN: MaxMinFairAllocator,
+}
+
+
+def make_rate_allocator(mode):
+    if mode not in RATE_ALLOCATORS:
+        raise ValueError(f"未知的速率分配模式: {mode}，可选: {list(RATE_ALLOCATORS)}")
+    return RATE_ALLOCATORS[mode]()
@@ -0,0 +1,88 @@
+import random
+
+ROUTING_STATIC = "static"               # 加载workload时随机选定路径（原有方式）
+ROUTING_LEAST_LOADED = "least_loaded"   # 流开始时在各等价节点路径上逐跳选最空闲的并行链路，取瓶颈最好的路径
+ROUTING_POWER_OF_TWO = "power_of_two"   # 流开始时随机取两条等价路径，选瓶颈较好的
+ROUTING_FLOWLET = "flowlet"             # 同一收发对在间隔flowlet_gap内开始的流沿用上一条路径，否则按least_loaded重选
+ROUTING_MODES = [ROUTING_STATIC, ROUTING_LEAST_LOADED, ROUTING_POWER_OF_TWO, ROUTING_FLOWLET]
+
+FLOWLET_GAP = 0.0005    # flowlet间隔（秒）
+
+
+def link_key(link):
+    """
+    链路的拥塞程度（越小越空闲）：先比较新流按均分可得的带宽，再比较当前负载。
+    只读取增量维护的active_flows大小和load，O(1)；同一批次中先开始的流已计入active_flows，
+    同时开始的流不会挤到同一条链路上
+    """
+    return -link.bandwidth / (len(link.active_flows) + 1), link.load
+
+
+class Router:
+    """流开始时按链路当前负载选路（见ROUTING_*），候选路径为拓扑ECMP索引中的等价最短路径"""
+    def __init__(self, mode, topo, links, rng=None, flowlet_gap=FLOWLET_GAP, path_record=None):
+        """
+        :param links: 仿真器的 {链路名称: Link}
+        :param path_record: 可选，流开始时写入 "流名称: [链路名称, ...]" 的文件对象
+        """
+        if mode not in ROUTING_MODES or mode == ROUTING_STATIC:
+            raise ValueError(f"未知的动态选路模式: {mode}，可选: {ROUTING_MODES[1:]}")
+        self.mode = mode
+        self.topo = topo
+        self.links = [links.get(link_name) for link_name in topo.link_names]  # 拓扑链路id -> Link
+        self.rng = rng if rng is not None else random.Random()
+        self.flowlet_gap = flowlet_gap
+        self.flowlets = {}      # (起点, 终点) -> (上一条路径的拓扑链路id元组, 开始时间)
+        self.path_record = path_record
+
+    def choose(self, flow, time):
+        """为flow.route = (起点, 终点) 选路，返回Link列表"""
+        entry = self.topo.ecmp(*flow.route)
+        if self.mode == ROUTING_POWER_OF_TWO:
+            first, second = entry.choose(self.rng), entry.choose(self.rng)
+            path = first if self._path_key(first) <= self._path_key(second) else second
+        elif self.mode == ROUTING_FLOWLET:
+            last = self.flowlets.get(flow.route)
+            path = last[0] if last is not None and time - last[1] <= self.flowlet_gap else self._least_loaded(entry)
+            self.flowlets[flow.route] = (path, time)
+        else:
+            path = self._least_loaded(entry)
+        if self.path_record is not None:
+            self.path_record.write(f"{flow.flow_id}: {self.topo.path_names(path)}\n")
+        return [self.links[link_id] for link_id in path]
+
+    def _path_key(self, path):
+        """路径的瓶颈：各链路中最拥塞的一条"""
+        return max(link_key(self.links[link_id]) for link_id in path)
+
+    def _least_loaded(self, entry):
+        """
+        每条等价节点路径逐跳取最空闲的并行链路，再取瓶颈最好的节点路径，
+        代价为各跳并行链路数之和，而不是展开后的链路级路径数（各跳并行链路数之积）
+        """
+        best_path, best_key = None, None
+        for groups in entry.hop_groups:
+            path = tuple(min(group, key=lambda link_id: link_key(self.links[link_id])) for group in groups)
+            key = self._path_key(path)
+            if best_key is None or key < best_key:
+                best_path, best_key = path, key
+        return best_path
+
+    def state(self):
+        return {"mode": self.mode, "flowlet_gap": self.flowlet_gap, "flowlets": dict(self.flowlets),
+                "rng": self.rng.getstate()}
+
+    @classmethod
+    def from_state(cls, state, topo, links):
+        rng = random.Random()
+        rng.setstate(state["rng"])
+        router = cls(state["mode"], topo, links, rng, state["flowlet_gap"])
+        router.flowlets = dict(state["flowlets"])
+        return router
+
+
+def make_router(mode, topo, links, rng=None, **kwargs):
+    """ROUTING_STATIC返回None（路径在加载workload时选定），其他模式返回Router"""
+    if mode == ROUTING_STATIC:
+        return None
+    return Router(mode, topo, links, rng, **kwargs)
@@ -1,32 +1,6 @@
-import re
-from ast import literal_eval
-
-def extract_flow_rates(file_path, target_flow):
-    results = []
-    
-    with open(file_path, 'r') as f:
-        for line in f:
-            # 修复单引号问题并解析为字典
-            try:
-                line_data = literal_eval(line.strip())
-                timestamp = float(line_data['time'])
-                flows = line_data['flow']
-                
-                # 精确匹配目标流量名称
-                if target_flow in flows:
-                    results.append( (timestamp, flows[target_flow]) )
-                    
-            except Exception as e:
-                print(f"解析行时出错: {line}\n错误: {str(e)}")
-                continue
-                
-    # 按时间排序并去重（保留最后出现值）
-    sorted_results = sorted(results, key=lambda x: x[0])
-    final = {}
-    for t, rate in sorted_results:
-        final[t] = rate  # 相同时间戳保留最后出现的值
-    return list(final.items())
+import sys
 
+from trace_reader import FlowTraceIndex
 
 def calculate_total_data(rate_sequence, end_time):
     """
@@ -57,10 +31,18 @@ def calculate_total_data(rate_sequence, end_time):
     return t_start, end_time, total_data
 
 # 使用示例
-file_path = "rate_record.txt"
-target_name = "DATA_B2b_DP1_PP1_TP0_Rank5_Rank1"
-end_time = 0.19188333333333332
-rate_sequence = extract_flow_rates(file_path, target_name)
+# 从轨迹的逐流索引中直接取该流的速率序列和统计，不需要扫描整个rate_record.txt
+num = int(sys.argv[1])
+bandwidth = int(sys.argv[2])
+target_name = sys.argv[3] if len(sys.argv) > 3 else "DATA_B2b_DP1_PP1_TP0_Rank5_Rank1"
+delay = 2
+file_name = f"link_num_{num}_bandwidth_{bandwidth}_delay_{delay}"
+
+flow_index = FlowTraceIndex.from_trace(f"{file_name}_trace")
+times, rates = flow_index.rates(target_name)
+rate_sequence = list(zip(times.tolist(), rates.tolist()))
+record = flow_index.record(target_name)
+end_time = record["end_time"]
 
 # 打印输出
 print(f"流量 {target_name} 的速率变化：")
@@ -70,10 +52,7 @@ for timestamp, rate in rate_sequence:
 t_start, t_end, total_data = calculate_total_data(rate_sequence, end_time)
 
 # 输出结果
-print(f"开始时间: {t_start:.4f}s")
+print(f"开始时间: {record['start_time']:.4f}s")
 print(f"结束时间: {t_end:.4f}s")
-print(f"总发送数据量: {total_data:.2f} MB")
-
-    
-
-    
\ No newline at end of file
+print(f"FCT: {record['fct']:.4f}s, slowdown: {record['slowdown']:.2f}")
+print(f"总发送数据量: {total_data:.2f} MB（仿真器统计: {record['bytes_sent']:.2f} MB）")
@@ -1,37 +1,78 @@
 import heapq
+import math
+import numbers
+import operator
+import pickle
 from collections import defaultdict
 
+import numpy as np
+
+from link_stats import LinkUtilStats
+from profiler import EventLoopProfiler
+from observer import (ALL_EVENTS, FLOW_START, FLOW_END, TASK_START, TASK_END, RATE_CHANGE, LINK_LOAD, LINK_UTIL,
+                      ObjectEvent, ValuesEvent, Subscription)
+from rate_allocator import make_rate_allocator, RATE_EQUAL_SHARE
+from router import Router
+from trace_writer import TraceWriter, KIND_FLOW, KIND_TASK
+
+# 已发送量与数据量的相对误差上限（速率积分的浮点误差）
+BYTES_SENT_RTOL = 1e-9
+
 class Link:
-    def __init__(self, bandwidth, delay):
+    __slots__ = ('index', 'name', 'bandwidth', 'delay', 'active_flows', 'load')
+
+    def __init__(self, bandwidth, delay, index=None, name=None):
+        self.index = index          # 链路整数id（轨迹中使用）
+        self.name = name            # 链路名称
         self.bandwidth = bandwidth  # 带宽（Gbps）
         self.delay = delay          # 时延（ms）
         self.active_flows = set()   # 当前使用该链路的流
+        self.load = 0               # 当前负载（Gbps），随流速率变化增量维护
 
     def available_bandwidth(self):
         """可用带宽（Gbps）"""
         return self.bandwidth / len(self.active_flows) if self.active_flows else self.bandwidth
 
+    def add_rate(self, delta_rate):
+        """按流速率变化量（Mbps）更新负载"""
+        if self.active_flows:
+            self.load += delta_rate / 1000  # Mbps转Gbps
+        else:
+            self.load = 0               # 链路空闲时清零，避免浮点误差累积
+
     def calculate_load(self):
         """链路负载（Gbps）"""
-        return sum(flow.rate / 1000 for flow in self.active_flows)  # Mbps转Gbps
+        return self.load
 
 class Flow:
-    def __init__(self, flow_id, size, path, dependency=None):
+    __slots__ = ('index', 'node', 'flow_id', 'size', 'path', 'start_time', 'end_time', 'rate',
+                 'remaining_size', 'current_event', 'last_begin_time', 'propagation_delay', 'bytes_sent', 'route')
+
+    def __init__(self, flow_id, size, path, index=None, node=None, route=None):
+        self.index = index          # 流整数id（轨迹中使用）
+        self.node = node            # 依赖图中的节点id
         self.flow_id = flow_id
         self.size = size            # 数据量（MB）
         self.path = path            # 路径（Link列表）
-        self.dependency = dependency  # 依赖事件（例如 "flow_end_flow1"）
         self.start_time = None      # 开始时间
         self.end_time = None        # 结束时间
         self.rate = 0               # 当前速率（Mbps）
         self.remaining_size = size  # 剩余数据量（MB）
         self.current_event = None   # 当前关联的事件
         self.last_begin_time = 0    # 上一次速率改变的时间
+        self.propagation_delay = sum(link.delay for link in path) / 1000  # 路径总传播时延（秒），只算一次
+        self.bytes_sent = 0         # 按速率对时间积分得到的已发送数据量（MB）
+        self.route = route          # 动态选路的 (起点, 终点)，None表示固定路径
+
+    def set_path(self, path):
+        """更换路径（流开始前）"""
+        self.path = path
+        self.propagation_delay = sum(link.delay for link in path) / 1000
 
-    def update_rate(self):
-        """根据路径中的瓶颈链路更新速率"""
+    def bottleneck_rate(self):
+        """路径中瓶颈链路的均分速率（Mbps）"""
         min_rate = min(link.available_bandwidth() * 1000 for link in self.path)  # Gbps转Mbps
-        self.rate = min_rate if min_rate != float('inf') else 0
+        return min_rate if min_rate != float('inf') else 0
 
     def transmission_time(self):
         """剩余传输时间（秒）"""
@@ -39,162 +80,396 @@ class Flow:
 
     def propagation_time(self):
         """总传播时延（秒）"""
-        return sum(link.delay for link in self.path) / 1000  # ms转秒
+        return self.propagation_delay
+
+    def settle(self, time):
+        """
+        把上次速率改变以来按当前速率发送的数据量计入已发送量，返回该数据量（MB）。
+        传输结束后流还要经过传播时延才结束，这段时间不再发送数据，因此不超过剩余数据量
+        """
+        sent = min(self.rate * (time - self.last_begin_time) / 8, self.remaining_size)
+        self.bytes_sent += sent
+        return sent
+
+    def ideal_fct(self):
+        """独占路径时的完成时间（秒）：按路径最小链路带宽发送，再加传播时延"""
+        line_rate = min((link.bandwidth for link in self.path), default=0) * 1000  # Gbps转Mbps
+        return self.size * 8 / line_rate + self.propagation_delay if line_rate else float('inf')
 
 class Task:
-    def __init__(self, task_id, compute_time, dependency=None):
+    __slots__ = ('index', 'node', 'task_id', 'compute_time', 'start_time', 'end_time')
+
+    def __init__(self, task_id, compute_time, index=None, node=None):
+        self.index = index                # 任务整数id（轨迹中使用）
+        self.node = node                  # 依赖图中的节点id
         self.task_id = task_id
         self.compute_time = compute_time  # 计算时间（秒）
-        self.dependency = dependency      # 依赖事件（例如 "flow_end_flow1"）
         self.start_time = None
         self.end_time = None
 
 class Event:
+    __slots__ = ('time', 'event_type', 'obj', 'cancelled')
+
     def __init__(self, time, event_type, obj):
         self.time = time
         self.event_type = event_type  # 事件类型：flow_start, flow_end, task_start, task_end
         self.obj = obj                # 关联的Flow或Task对象
+        self.cancelled = False        # 墓碑标记：被取消的事件留在堆中，出队时跳过
 
     def __lt__(self, other):
         return self.time < other.time
 
 class Simulator:
-    def __init__(self, file_name):
+    # 墓碑事件数超过该下限且占堆一半以上时压缩事件队列
+    COMPACT_MIN_CANCELLED = 1024
+
+    def __init__(self, file_name, trace=None, rate_mode=RATE_EQUAL_SHARE, time_epsilon=0):
         self.links = {}                 # {link_id: Link}
         self.flows = {}                 # {flow_id: Flow}
         self.tasks = {}                 # {task_id: Task}
         self.event_queue = []           # 事件优先队列
+        self.cancelled_count = 0        # 堆中尚未弹出的已取消事件数
+        self.load_dirty_links = set()   # 上次记录link_load后负载变化过的链路
+        self.util_dirty_links = set()   # 上次记录link_util后负载变化过的链路
+        self.affected_links = {}        # 当前批次中流增删涉及的链路（有序集合）
+        self.stats_dirty_links = set()  # 当前批次中负载变化过的链路，批次结束时计入利用率统计
         self.current_time = 0           # 当前仿真时间
-        self.completed_events = set()   # 已完成的依赖事件集合
-        self.event_dependencies = defaultdict(list)  # 事件到依赖者的映射
+        self.time_epsilon = time_epsilon  # 与批次起始时间相差不超过该值的事件合并处理
+        # 依赖图：流和任务按添加顺序编号为节点，前驱全部完成后开始
+        self.nodes = []                 # 节点id -> Flow/Task
+        self.pending = []               # 节点id -> 尚未完成的前驱数
+        self.successors = []            # 节点id -> 后继节点id列表，节点完成后置为None
+        self.waiting = defaultdict(list)  # 尚未添加的前驱（名称或节点id） -> 等待它的节点id
         self.file_name = file_name
+        self.subscriptions = {}         # 事件类型 -> [Subscription]，只保存有订阅者的类型
+        self.rate_mode = rate_mode
+        self.rate_allocator = make_rate_allocator(rate_mode)  # 速率分配引擎
+        self.link_stats = LinkUtilStats()  # 链路利用率的在线统计
+        self.profiler = None            # 事件循环统计（见enable_profiling），默认关闭
+        self.router = None              # 流开始时动态选路（见router.py），None表示使用固定路径
+        # 轨迹文件输出是内置的订阅者；trace=False时不写轨迹，没有订阅者的事件不产生任何记录
+        if trace is None:
+            trace = TraceWriter(file_name)
+        self.trace = trace or None
+        if self.trace is not None:
+            self.trace.observe(self)
+
+    def add_link(self, link_id, bandwidth, delay, role=None):
+        if self.trace is not None:
+            self.trace.register_link(link_id, bandwidth, role)
+        index = self.link_stats.register(bandwidth, role)
+        self.links[link_id] = Link(bandwidth, delay, index, link_id)
+
+    def add_links(self, link_specs):
+        """批量添加链路，link_specs: [(link_id, 带宽Gbps, 时延ms, 角色), ...]"""
+        for link_id, bandwidth, delay, role in link_specs:
+            self.add_link(link_id, bandwidth, delay, role)
+
+    def close(self):
+        """交出批量订阅中剩余的记录，写出逐流统计并关闭轨迹文件"""
+        self.flush_subscriptions()
+        if self.trace is not None:
+            self.trace.write_flow_stats(self.flow_stats())
+            self.trace.close()
 
-    def add_link(self, link_id, bandwidth, delay):
-        self.links[link_id] = Link(bandwidth, delay)
+    def subscribe(self, callback, events=ALL_EVENTS, batch_size=None):
+        """
+        订阅仿真事件（见observer.py）：callback收到ObjectEvent/ValuesEvent记录，
+        batch_size给出时攒够batch_size条记录后一次收到记录列表（run结束和close时交出剩余的记录）
+        :param events: 事件类型列表，默认全部
+        :return: Subscription，用于unsubscribe
+        """
+        subscription = Subscription(callback, tuple(events), batch_size)
+        for event in subscription.events:
+            if event not in ALL_EVENTS:
+                raise ValueError(f"未知的事件类型: {event}，可选: {list(ALL_EVENTS)}")
+            self.subscriptions.setdefault(event, []).append(subscription)
+        return subscription
 
-    def add_flow(self, flow_id, size, path, dependency=None):
-        flow = Flow(flow_id, size, path, dependency)
+    def unsubscribe(self, subscription):
+        subscription.flush()
+        for event in subscription.events:
+            subscriptions = self.subscriptions.get(event, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(event, None)
+
+    def flush_subscriptions(self):
+        for subscription in {id(s): s for subscriptions in self.subscriptions.values() for s in subscriptions}.values():
+            subscription.flush()
+
+    def publish(self, record):
+        """把记录交给订阅了record.event的订阅者"""
+        for subscription in self.subscriptions.get(record.event, ()):
+            subscription.deliver(record)
+
+    def flow_stats(self):
+        """
+        逐流统计（下标为流整数id，未开始/未结束的流对应项为nan）
+        :return: {列名: numpy数组}，列为 size（MB）、start_time、end_time、fct、ideal_fct（秒）、
+                 slowdown（fct / ideal_fct）、bytes_sent（MB）
+        """
+        flow_list = sorted(self.flows.values(), key=lambda flow: flow.index)
+        nan = float('nan')
+        start_time = np.array([nan if flow.start_time is None else flow.start_time for flow in flow_list])
+        end_time = np.array([nan if flow.end_time is None else flow.end_time for flow in flow_list])
+        ideal_fct = np.array([flow.ideal_fct() for flow in flow_list])
+        fct = end_time - start_time
+        return {
+            "size": np.array([flow.size for flow in flow_list], dtype=np.float64),
+            "start_time": start_time,
+            "end_time": end_time,
+            "fct": fct,
+            "ideal_fct": ideal_fct,
+            "slowdown": fct / ideal_fct,
+            "bytes_sent": np.array([flow.bytes_sent for flow in flow_list], dtype=np.float64),
+        }
+
+    def flow_record(self, flow_id):
+        """单个流的统计（同flow_stats的各列）"""
+        flow = self.flows[flow_id]
+        fct = flow.end_time - flow.start_time if flow.end_time is not None else None
+        ideal_fct = flow.ideal_fct()
+        return {
+            "size": flow.size,
+            "start_time": flow.start_time,
+            "end_time": flow.end_time,
+            "fct": fct,
+            "ideal_fct": ideal_fct,
+            "slowdown": fct / ideal_fct if fct is not None else None,
+            "bytes_sent": flow.bytes_sent,
+        }
+
+    def add_flow(self, flow_id, size, path, dependency=None, route=None):
+        """
+        dependency: 前驱（流/任务名称或节点id）或前驱列表，全部完成后流才开始
+        route: 拓扑中的 (起点, 终点)，设置了router时流开始时按链路负载重新选路，path只作为开始前的初始路径
+        """
+        index = self.trace.register_object(KIND_FLOW, flow_id) if self.trace is not None else len(self.flows)
+        flow = Flow(flow_id, size, path, index, route=route)
         self.flows[flow_id] = flow
-        if dependency:
-            self.event_dependencies[dependency].append(flow)
-        else:
-            self.schedule_event(Event(0, 'flow_start', flow))
+        self.add_node(flow, flow_id, dependency)
+        return flow.node
 
     def add_task(self, task_id, compute_time, dependency=None):
-        task = Task(task_id, compute_time, dependency)
+        """dependency: 同add_flow"""
+        index = self.trace.register_object(KIND_TASK, task_id) if self.trace is not None else len(self.tasks)
+        task = Task(task_id, compute_time, index)
         self.tasks[task_id] = task
-        if dependency:
-            self.event_dependencies[dependency].append(task)
-        else:
-            self.schedule_event(Event(0, 'task_start', task))
+        self.add_node(task, task_id, dependency)
+        return task.node
+
+    def add_node(self, obj, name, dependency):
+        """
+        把流/任务加入依赖图，返回其节点id（按添加顺序从0编号）
+        前驱尚未添加时先按名称/节点id登记等待，添加时再连边；没有未完成的前驱时立即调度开始事件
+        """
+        node = len(self.nodes)
+        obj.node = node
+        self.nodes.append(obj)
+        successors = []
+        self.successors.append(successors)
+        for key in (name, node):
+            if key in self.waiting:
+                successors.extend(self.waiting.pop(key))
+
+        pending = 0
+        if dependency is None or isinstance(dependency, (str, numbers.Integral)):
+            dependency = (dependency,) if dependency is not None and dependency != "" else ()
+        for predecessor in dependency:
+            if isinstance(predecessor, numbers.Integral):
+                predecessor = operator.index(predecessor)   # numpy整数（如CSR workload中的下标）按节点id处理
+            else:
+                predecessor_obj = self.flows.get(predecessor) or self.tasks.get(predecessor)
+                if predecessor_obj is None:
+                    self.waiting[predecessor].append(node)
+                    pending += 1
+                    continue
+                predecessor = predecessor_obj.node
+            if predecessor >= len(self.nodes):
+                self.waiting[predecessor].append(node)
+            elif self.successors[predecessor] is None:
+                continue    # 前驱已完成
+            else:
+                self.successors[predecessor].append(node)
+            pending += 1
+        self.pending.append(pending)
+        if not pending:
+            self.schedule_start(obj)
+        return node
+
+    def schedule_start(self, obj):
+        """在当前时刻调度流/任务的开始事件"""
+        self.schedule_event(Event(self.current_time, 'flow_start' if isinstance(obj, Flow) else 'task_start', obj))
+
+    def link_util_report(self, end_time=None):
+        """
+        链路利用率的时间加权统计（见LinkUtilStats.report），end_time默认为最后一个流/任务结束的时间
+        :return: (逐链路统计, 逐角色统计)
+        """
+        if end_time is None:
+            end_times = [obj.end_time for objects in (self.flows, self.tasks)
+                         for obj in objects.values() if obj.end_time is not None]
+            end_time = max(end_times, default=self.current_time)
+        return self.link_stats.report(end_time)
+
+    def enable_profiling(self, progress_interval=None, progress_file=None):
+        """
+        启用事件循环的计数和计时（见profiler.EventLoopProfiler），未启用时没有任何统计开销
+        :param progress_interval: 每隔多少秒（墙钟时间）输出一行进度
+        :return: EventLoopProfiler，report()/format_report()读取统计结果
+        """
+        return EventLoopProfiler(progress_interval, progress_file).attach(self)
 
     def schedule_event(self, event):
         heapq.heappush(self.event_queue, event)
 
     def cancel_event(self, event):
-        """取消指定事件"""
-        if event in self.event_queue:
-            self.event_queue.remove(event)
-            heapq.heapify(self.event_queue)
+        """取消指定事件（O(1)打墓碑标记，出队时跳过）"""
+        if event.cancelled:
+            return
+        event.cancelled = True
+        self.cancelled_count += 1
+        if (self.cancelled_count > self.COMPACT_MIN_CANCELLED
+                and self.cancelled_count * 2 > len(self.event_queue)):
+            self.compact_event_queue()
+
+    def compact_event_queue(self):
+        """清除堆中的墓碑事件并重建堆"""
+        self.event_queue = [event for event in self.event_queue if not event.cancelled]
+        heapq.heapify(self.event_queue)
+        self.cancelled_count = 0
+
+    def next_event_time(self):
+        """下一个有效事件的时间，队列为空时返回None"""
+        while self.event_queue and self.event_queue[0].cancelled:
+            heapq.heappop(self.event_queue)
+            self.cancelled_count -= 1
+        return self.event_queue[0].time if self.event_queue else None
+
+    def pop_event(self, max_time=float('inf')):
+        """弹出时间不晚于max_time的下一个有效事件，没有时返回None"""
+        while self.event_queue:
+            event = self.event_queue[0]
+            if event.cancelled:
+                heapq.heappop(self.event_queue)
+                self.cancelled_count -= 1
+                continue
+            if event.time > max_time:
+                return None
+            return heapq.heappop(self.event_queue)
+        return None
+
+    def change_flow_rate(self, flow, new_rate):
+        """修改流速率，并把速率差累加到路径上各链路的负载"""
+        delta_rate = new_rate - flow.rate
+        flow.rate = new_rate
+        if delta_rate:
+            for link in flow.path:
+                link.add_rate(delta_rate)
+                self.load_dirty_links.add(link)
+                self.stats_dirty_links.add(link)
+                self.util_dirty_links.add(link)
+
+    def record_link_load(self):
+        """只记录自上次记录以来负载有变化的链路"""
+        if not self.load_dirty_links:
+            return
+        if LINK_LOAD in self.subscriptions:
+            self.publish(ValuesEvent(LINK_LOAD, self.current_time,
+                                     [(link, link.load) for link in self.load_dirty_links]))
+        self.load_dirty_links.clear()
+
+    def record_link_util(self):
+        """只记录自上次记录以来利用率有变化的链路"""
+        if not self.util_dirty_links:
+            return
+        if LINK_UTIL in self.subscriptions:
+            self.publish(ValuesEvent(LINK_UTIL, self.current_time,
+                                     [(link, link.load / link.bandwidth) for link in self.util_dirty_links]))
+        self.util_dirty_links.clear()
 
     def update_flow_rates(self, affected_links):
         """更新受影响的流速率并重新调度"""
-        seen_flows = set()
-        for link in affected_links:
-            for flow in link.active_flows:
-                if flow not in seen_flows:
-                    if flow.current_event:
-                        # 更新remaining_size
-                        flow.remaining_size -= flow.rate * (self.current_time - flow.last_begin_time) / 8
-                        self.cancel_event(flow.current_event)
-                    flow.update_rate()
-                    seen_flows.add(flow)
-                    
-        
-        rate_record = {}
-        for flow in seen_flows:
+        rate_record = [] if RATE_CHANGE in self.subscriptions else None
+        for flow, rate in self.rate_allocator.allocate(affected_links):
+            pending = flow.current_event is not None and not flow.current_event.cancelled
+            if pending and rate == flow.rate:
+                continue  # 速率未变，已调度的结束事件仍然有效
+            if flow.current_event:
+                # 更新remaining_size和已发送量
+                flow.remaining_size -= flow.settle(self.current_time)
+                if pending and not flow.remaining_size:
+                    # 数据已发完、只剩传播时延：结束时间不变，只更新速率（链路负载）
+                    self.change_flow_rate(flow, rate)
+                    flow.last_begin_time = self.current_time
+                    if rate_record is not None:
+                        rate_record.append((flow, flow.rate / 1000))
+                    continue
+                self.cancel_event(flow.current_event)
+            self.change_flow_rate(flow, rate)
             if flow.rate > 0:
                 end_time = self.current_time + flow.transmission_time() + flow.propagation_time()
                 flow.current_event = Event(end_time, 'flow_end', flow)
                 flow.last_begin_time = self.current_time
                 self.schedule_event(flow.current_event)
-                rate_record[flow.flow_id] = flow.rate / 1000 #记录的是流的速率，单位是Gbps
-                
-        with open(f"{self.file_name}_rate_record.txt", "a") as file:
-            rate_dict = {
-                "time": self.current_time,
-                "flow": rate_record
-            }
-            file.write(f"{rate_dict}\n")
-                
+                if rate_record is not None:
+                    rate_record.append((flow, flow.rate / 1000)) #记录的是流的速率，单位是Gbps
+
+        if rate_record is not None:
+            self.publish(ValuesEvent(RATE_CHANGE, self.current_time, rate_record))
 
     def handle_flow_start(self, flow):
         """处理流开始事件"""
         # 记录流开始日志
-        with open(f"{self.file_name}_records.txt", "a") as file:
-            file.write(f"Flow,{flow.flow_id},begin,{self.current_time}\n")
-        
-        # 记录链路负载变化
-        with open(f"{self.file_name}_link_load.txt", "a") as file:
-            load_dict = {
-                "time": self.current_time,
-                "link": {link_id: link.calculate_load() for link_id, link in self.links.items()}
-            }
-            file.write(f"{load_dict}\n")
-        
-        # 记录链路利用率变化
-        with open(f"{self.file_name}_link_util.txt", "a") as file:
-            load_dict = {
-                "time": self.current_time,
-                "link": {link_id: link.calculate_load() / link.bandwidth for link_id, link in self.links.items()}
-            }
-            file.write(f"{load_dict}\n")
-
-        # 添加流到所有路径链路
+        if self.subscriptions:
+            self.publish(ObjectEvent(FLOW_START, self.current_time, flow))
+
+        # 记录链路负载变化（仅变化的链路）
+        self.record_link_load()
+
+        # 记录链路利用率变化（仅变化的链路）
+        self.record_link_util()
+
+        # 动态选路：按当前链路负载选定路径
+        if flow.route is not None and self.router is not None:
+            flow.set_path(self.router.choose(flow, self.current_time))
+
+        # 添加流到所有路径链路，速率在本批次事件处理完后统一更新
+        flow.start_time = self.current_time
         for link in flow.path:
             link.active_flows.add(flow)
-        self.update_flow_rates(flow.path)
+            self.affected_links[link] = None
 
     def handle_flow_end(self, flow):
+        flow.settle(self.current_time)
         flow.end_time = self.current_time
         flow.remaining_size = 0
+        flow.current_event = None
         
         # 记录流结束日志
-        with open(f"{self.file_name}_records.txt", "a") as file:
-            file.write(f"Flow,{flow.flow_id},finish,{self.current_time}\n")
-        
-        # 记录链路负载变化
-        with open(f"{self.file_name}_link_load.txt", "a") as file:
-            load_dict = {
-                "time": self.current_time,
-                "link": {link_id: link.calculate_load() for link_id, link in self.links.items()}
-            }
-            file.write(f"{load_dict}\n")
+        if self.subscriptions:
+            self.publish(ObjectEvent(FLOW_END, self.current_time, flow))
+
+        # 记录链路负载变化（仅变化的链路）
+        self.record_link_load()
 
         # 从链路移除流
         for link in flow.path:
             if flow in link.active_flows:
                 link.active_flows.remove(flow)
-        self.update_flow_rates(flow.path)
+            self.affected_links[link] = None
+        self.change_flow_rate(flow, 0)
 
-        # 处理依赖关系（使用安全的pop方法）
-        completed_event = f"{flow.flow_id}"
-        self.completed_events.add(completed_event)
-        
-        # 关键修改：使用pop获取并删除依赖项，避免KeyError
-        dependents = self.event_dependencies.pop(completed_event, [])
-        for dependent in dependents:
-            if isinstance(dependent, Flow):
-                new_event = Event(self.current_time, 'flow_start', dependent)
-            elif isinstance(dependent, Task):
-                new_event = Event(self.current_time, 'task_start', dependent)
-            self.schedule_event(new_event)
+        # 处理依赖关系
+        self.release_dependents(flow.node)
 
     def handle_task_start(self, task):
         """处理任务开始事件"""
         # 记录任务开始日志
-        with open(f"{self.file_name}_records.txt", "a") as file:
-            file.write(f"Task,{task.task_id},begin,{self.current_time}\n")
+        if self.subscriptions:
+            self.publish(ObjectEvent(TASK_START, self.current_time, task))
         
         # 计算任务结束时间
         task.start_time = self.current_time
@@ -205,35 +480,208 @@ class Simulator:
         task.end_time = self.current_time
         
         # 记录任务结束日志
-        with open(f"{self.file_name}_records.txt", "a") as file:
-            file.write(f"Task,{task.task_id},finish,{self.current_time}\n")
+        if self.subscriptions:
+            self.publish(ObjectEvent(TASK_END, self.current_time, task))
 
-        # 处理依赖关系（使用安全的pop方法）
-        completed_event = f"{task.task_id}"
-        self.completed_events.add(completed_event)
-        
-        # 关键修改：使用pop获取并删除依赖项，避免KeyError
-        dependents = self.event_dependencies.pop(completed_event, [])
-        for dependent in dependents:
-            if isinstance(dependent, Flow):
-                new_event = Event(self.current_time, 'flow_start', dependent)
-            elif isinstance(dependent, Task):
-                new_event = Event(self.current_time, 'task_start', dependent)
-            self.schedule_event(new_event)
-    def run(self):
-        """运行仿真"""
-        while self.event_queue:
-            event = heapq.heappop(self.event_queue)
-            self.current_time = event.time
-            
-            if event.event_type == 'flow_start':
-                self.handle_flow_start(event.obj)
-            elif event.event_type == 'flow_end':
-                self.handle_flow_end(event.obj)
-            elif event.event_type == 'task_start':
-                self.handle_task_start(event.obj)
-            elif event.event_type == 'task_end':
-                self.handle_task_end(event.obj)
+        # 处理依赖关系
+        self.release_dependents(task.node)
+
+    def release_dependents(self, node):
+        """节点完成：各后继的未完成前驱数减一，减到0的在当前时刻开始（O(出度)）"""
+        successors = self.successors[node]
+        self.successors[node] = None
+        pending = self.pending
+        for successor in successors:
+            pending[successor] -= 1
+            if not pending[successor]:
+                self.schedule_start(self.nodes[successor])
+
+    def handle_event(self, event):
+        if event.event_type == 'flow_start':
+            self.handle_flow_start(event.obj)
+        elif event.event_type == 'flow_end':
+            self.handle_flow_end(event.obj)
+        elif event.event_type == 'task_start':
+            self.handle_task_start(event.obj)
+        elif event.event_type == 'task_end':
+            self.handle_task_end(event.obj)
+
+    def process_batch(self, event):
+        """
+        处理同一时刻（time_epsilon内）的全部事件：先完成流增删和任务状态转换
+        （包括期间释放的同一时刻依赖事件），最后统一重算一次受影响流的速率
+        """
+        self.current_time = event.time
+        batch_end = event.time + self.time_epsilon
+        while event is not None:
+            self.handle_event(event)
+            event = self.pop_event(batch_end)
+        if self.affected_links:
+            affected_links = list(self.affected_links)
+            self.affected_links.clear()
+            self.update_flow_rates(affected_links)
+        # 批次内的速率是逐个流调整的，只把批次结束时的负载计入统计
+        for link in self.stats_dirty_links:
+            self.link_stats.update(link.index, self.current_time, link.load)
+        self.stats_dirty_links.clear()
+
+    def run(self, until=None, check=False):
+        """
+        运行仿真；给出until时，在下一批事件晚于until时暂停，
+        之后可以save_checkpoint，或直接再次调用run继续
+        :param check: 运行结束时用check_bytes_sent检查已发送量（调试用，默认不检查）
+        """
+        while True:
+            if until is not None:
+                next_time = self.next_event_time()
+                if next_time is None or next_time > until:
+                    break
+            event = self.pop_event()
+            if event is None:
+                break
+            self.process_batch(event)
+        self.flush_subscriptions()
+        if self.trace is not None:
+            self.trace.flush()
+        if check and until is None:
+            self.check_bytes_sent()
+
+    def check_bytes_sent(self):
+        """
+        已结束的流按速率积分得到的已发送量应等于其数据量，否则抛出RuntimeError。
+        time_epsilon > 0 时批次内的事件最多提前time_epsilon处理，相对误差上限按 time_epsilon / FCT 放宽
+        """
+        for flow in self.flows.values():
+            if flow.end_time is None:
+                continue
+            fct = flow.end_time - flow.start_time
+            rel_tol = BYTES_SENT_RTOL + (self.time_epsilon / fct if fct > 0 else 0)
+            if not math.isclose(flow.bytes_sent, flow.size, rel_tol=rel_tol, abs_tol=BYTES_SENT_RTOL):
+                raise RuntimeError(f"流{flow.flow_id}的已发送量{flow.bytes_sent}MB与数据量{flow.size}MB不一致")
+
+    def save_checkpoint(self, path):
+        """
+        把完整仿真状态（见checkpoint_state）保存为二进制文件，只能在两批事件之间（run暂停或结束后）调用
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self.checkpoint_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def checkpoint_state(self):
+        """
+        完整仿真状态（链路、流、任务、事件堆、依赖关系、轨迹写出位置），对象之间的引用都转成整数下标
+        """
+        flow_list = list(self.flows.values())
+        task_list = list(self.tasks.values())
+        objects = {id(obj): (KIND_FLOW, i) for i, obj in enumerate(flow_list)}
+        objects.update({id(obj): (KIND_TASK, i) for i, obj in enumerate(task_list)})
+        event_position = {id(event): i for i, event in enumerate(self.event_queue)}
+        return {
+            "file_name": self.file_name,
+            "rate_mode": self.rate_mode,
+            "time_epsilon": self.time_epsilon,
+            "current_time": self.current_time,
+            "cancelled_count": self.cancelled_count,
+            "links": [(link_id, link.bandwidth, link.delay, link.load) for link_id, link in self.links.items()],
+            "flows": [(flow.flow_id, flow.size, [link.index for link in flow.path], flow.node,
+                       flow.start_time, flow.end_time, flow.rate, flow.remaining_size, flow.last_begin_time,
+                       flow.bytes_sent, flow.route, event_position.get(id(flow.current_event), -1))
+                      for flow in flow_list],
+            "tasks": [(task.task_id, task.compute_time, task.node, task.start_time, task.end_time)
+                      for task in task_list],
+            # 按堆数组原样保存（含墓碑事件），恢复后同时刻事件的出队顺序不变
+            "events": [(event.time, event.event_type, *objects[id(event.obj)], event.cancelled)
+                       for event in self.event_queue],
+            "load_dirty_links": [link.index for link in self.load_dirty_links],
+            "util_dirty_links": [link.index for link in self.util_dirty_links],
+            "nodes": [objects[id(obj)] for obj in self.nodes],
+            "pending": list(self.pending),
+            "successors": [successors if successors is None else list(successors)
+                           for successors in self.successors],
+            "waiting": {key: list(nodes) for key, nodes in self.waiting.items()},
+            "link_stats": self.link_stats.state(),
+            "router": self.router.state() if self.router is not None else None,
+            "trace": self.trace.state() if self.trace is not None else None,
+        }
+
+    @classmethod
+    def load_checkpoint(cls, path, file_name=None, trace=None, topo=None):
+        """
+        从checkpoint恢复仿真器
+        :param file_name: 新的输出文件名前缀（用于从同一个checkpoint分叉多个后续运行），默认沿用原文件名
+        :param trace: 自定义的新轨迹写出器（False表示不写轨迹）；默认接着checkpoint时的轨迹继续写
+        :param topo: 使用动态选路时需给出同一拓扑，用于恢复router；不给出时尚未开始的流沿用初始路径
+        """
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        return cls.from_checkpoint_state(state, file_name, trace, topo)
+
+    @classmethod
+    def from_checkpoint_state(cls, state, file_name=None, trace=None, topo=None):
+        """按checkpoint_state恢复仿真器，参数同load_checkpoint"""
+        register = bool(trace)
+        if trace is None:
+            # checkpoint时没有写轨迹则恢复后也不写
+            trace = TraceWriter.resume(state["trace"], file_name) if state["trace"] is not None else False
+        simulator = cls(file_name or state["file_name"], trace=trace, rate_mode=state["rate_mode"],
+                        time_epsilon=state["time_epsilon"])
+        simulator.current_time = state["current_time"]
+        simulator.cancelled_count = state["cancelled_count"]
+
+        link_list = []
+        for link_id, bandwidth, delay, load in state["links"]:
+            role = state["link_stats"]["roles"][len(link_list)]
+            index = trace.register_link(link_id, bandwidth, role) if register else len(link_list)
+            link = Link(bandwidth, delay, index, link_id)
+            link.load = load
+            simulator.links[link_id] = link
+            link_list.append(link)
+
+        flow_list = []
+        for (flow_id, size, path, node, start_time, end_time, rate, remaining_size, last_begin_time,
+             bytes_sent, route, _) in state["flows"]:
+            index = trace.register_object(KIND_FLOW, flow_id) if register else len(flow_list)
+            flow = Flow(flow_id, size, [link_list[i] for i in path], index, node, route)
+            flow.start_time = start_time
+            flow.end_time = end_time
+            flow.rate = rate
+            flow.remaining_size = remaining_size
+            flow.last_begin_time = last_begin_time
+            flow.bytes_sent = bytes_sent
+            if start_time is not None and end_time is None:
+                for link in flow.path:
+                    link.active_flows.add(flow)
+            simulator.flows[flow_id] = flow
+            flow_list.append(flow)
+
+        task_list = []
+        for task_id, compute_time, node, start_time, end_time in state["tasks"]:
+            index = trace.register_object(KIND_TASK, task_id) if register else len(task_list)
+            task = Task(task_id, compute_time, index, node)
+            task.start_time = start_time
+            task.end_time = end_time
+            simulator.tasks[task_id] = task
+            task_list.append(task)
+
+        objects = {KIND_FLOW: flow_list, KIND_TASK: task_list}
+        for time, event_type, kind, index, cancelled in state["events"]:
+            event = Event(time, event_type, objects[kind][index])
+            event.cancelled = cancelled
+            simulator.event_queue.append(event)
+        for flow, flow_state in zip(flow_list, state["flows"]):
+            position = flow_state[-1]
+            flow.current_event = simulator.event_queue[position] if position >= 0 else None
+
+        simulator.load_dirty_links = {link_list[i] for i in state["load_dirty_links"]}
+        simulator.util_dirty_links = {link_list[i] for i in state["util_dirty_links"]}
+        simulator.link_stats = LinkUtilStats.from_state(state["link_stats"])
+        if state["router"] is not None and topo is not None:
+            simulator.router = Router.from_state(state["router"], topo, simulator.links)
+        simulator.nodes = [objects[kind][index] for kind, index in state["nodes"]]
+        simulator.pending = list(state["pending"])
+        simulator.successors = state["successors"]
+        for key, nodes in state["waiting"].items():
+            simulator.waiting[key] = nodes
+        return simulator
 
 # # 示例测试
 # if __name__ == "__main__":
@@ -0,0 +1,292 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from rate_allocator import RATE_EQUAL_SHARE
+from router import ROUTING_MODES, ROUTING_STATIC
+from simulator import Simulator
+from Topology import Topology
+from topo_builder import set_16_rank_topo
+from whatif import RecordedRun
+from workload import DEFAULT_CACHE_DIR, load_workload, add_workload_to_simulator
+
+DEFAULT_WORKLOAD = "/home/denghaotian/research/LLM_planning/data/workload_16_PP4_DP4_TP1_VPP2_BATCH8_NO_PRI.json"
+
+# 单次运行的默认参数，网格中未给出的参数取这里的值
+DEFAULT_PARAMS = {
+    "num": 1,                   # core-core并行链路对数
+    "bandwidth": 10,            # core-core链路带宽（Gbps）
+    "delay": 2,                 # core-core链路时延（ms）
+    "host_bandwidth": 200,      # host-leaf链路带宽（Gbps）
+    "fabric_bandwidth": 400,    # leaf-spine、spine-core链路带宽（Gbps）
+    "fabric_delay": 0.05,       # 非core链路时延（ms）
+    "rate_mode": RATE_EQUAL_SHARE,
+    "routing": ROUTING_STATIC,   # 选路模式（见router.py）
+    "seed": 0,                  # 选路随机种子
+}
+
+# 只影响core-core链路的参数，增量扫描时同一组内其余参数相同的运行可以复用前缀
+CORE_PARAMS = ("bandwidth", "delay")
+
+# 多种子集成运行汇总的指标
+ENSEMBLE_METRICS = ("makespan", "core_util", "fct_mean", "fct_p99", "slowdown_p99")
+# 双侧95%置信区间的t分布分位数，下标为自由度（1..30）；更大的自由度取不超过它的断点的值（偏保守）
+T_95 = [None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160,
+        2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
+        2.048, 2.045, 2.042]
+T_95_LARGE = [(30, 2.042), (40, 2.021), (60, 2.000), (120, 1.980)]
+
+# 进程池worker共享的workload和拓扑：fork时在父进程中建好，子进程写时复制共享
+_shared_workload = None
+_shared_topologies = {}         # num -> 已建好ECMP索引的Topology
+
+
+def shared_topology(num, workload=None):
+    """按core链路对数缓存拓扑；给出workload时预先建好其中所有收发对的ECMP索引"""
+    topo = _shared_topologies.get(num)
+    if topo is None:
+        topo = Topology()
+        set_16_rank_topo(None, topo, num, 0, 0)
+        _shared_topologies[num] = topo
+    if workload is not None:
+        pairs = set(zip(workload.src_rank.tolist(), workload.dst_rank.tolist()))
+        for src, dst in pairs:
+            if src >= 0:
+                topo.ecmp(str(src), str(dst))
+    return topo
+
+
+def _init_worker(workload_file, cache_dir):
+    global _shared_workload
+    if _shared_workload is None:
+        _shared_workload = load_workload(workload_file, cache_dir)
+
+
+def summarize_run(simulator, core_links):
+    """单次运行的汇总：完成时间、FCT和slowdown统计、core链路平均利用率"""
+    flows = [flow for flow in simulator.flows.values() if flow.end_time is not None]
+    end_times = [flow.end_time for flow in flows]
+    end_times += [task.end_time for task in simulator.tasks.values() if task.end_time is not None]
+    stats = simulator.flow_stats()
+    finished = ~np.isnan(stats["end_time"])
+    fct = stats["fct"][finished]
+    slowdown = stats["slowdown"][finished]
+
+    makespan = max(end_times) if end_times else 0
+    # core链路在[0, 完成时间]内的时间平均利用率（取在线的链路利用率统计，按带宽加权）
+    per_link, _ = simulator.link_util_report(makespan)
+    core_ids = [simulator.links[link_name].index for link_name in core_links]
+    core_bandwidths = [simulator.links[link_name].bandwidth for link_name in core_links]
+    core_util = float(np.average(per_link["mean_util"][core_ids], weights=core_bandwidths)) \
+        if core_ids and sum(core_bandwidths) else 0
+
+    return {
+        "makespan": makespan,
+        "flow_num": len(simulator.flows),
+        "finished_flow_num": len(flows),
+        "fct_mean": float(fct.mean()) if len(fct) else 0,
+        "fct_p50": float(np.percentile(fct, 50)) if len(fct) else 0,
+        "fct_p99": float(np.percentile(fct, 99)) if len(fct) else 0,
+        "fct_max": float(fct.max()) if len(fct) else 0,
+        "slowdown_p99": float(np.percentile(slowdown, 99)) if len(slowdown) else 0,
+        "core_util": core_util,
+    }
+
+
+def run_one(params, workload=None, trace=None):
+    """
+    按参数运行一次仿真并返回汇总结果
+    :param workload: 编译后的workload，默认使用worker共享的workload
+    :param trace: 轨迹输出，默认不写轨迹
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    start = time.perf_counter()
+    simulator, fabric = _build_simulator(params, workload, trace)
+    simulator.run()
+    simulator.close()
+
+    result = dict(params)
+    result.update(summarize_run(simulator, fabric.core_links()))
+    result["wall_time"] = time.perf_counter() - start
+    return result
+
+
+def _build_simulator(params, workload=None, trace=None):
+    """按完整参数建好仿真器并加入workload（尚未run），返回 (simulator, fabric)"""
+    workload = workload if workload is not None else _shared_workload
+    file_name = f"link_num_{params['num']}_bandwidth_{params['bandwidth']}_delay_{params['delay']}"
+    simulator = Simulator(file_name, trace=trace if trace is not None else False, rate_mode=params["rate_mode"])
+    topo = shared_topology(params["num"])
+    fabric = set_16_rank_topo(simulator, None, params["num"], params["bandwidth"], params["delay"],
+                              host_bandwidth=params["host_bandwidth"], fabric_bandwidth=params["fabric_bandwidth"],
+                              fabric_delay=params["fabric_delay"])
+    add_workload_to_simulator(workload, simulator, topo, random.Random(params["seed"]), routing=params["routing"])
+    return simulator, fabric
+
+
+def run_incremental(param_list, workload=None):
+    """
+    依次运行只有core链路参数（CORE_PARAMS）不同的一组参数：第一组完整运行并记录（RecordedRun），
+    其余用what-if从第一个经过core链路的流开始之前恢复，只重新仿真之后的部分
+    :return: 各组参数的汇总结果，resumed_from为重新仿真的起始时间（第一组为0）
+    """
+    results = []
+    recorded = None
+    for params in param_list:
+        params = {**DEFAULT_PARAMS, **params}
+        start = time.perf_counter()
+        if recorded is None:
+            simulator, fabric = _build_simulator(params, workload)
+            core_links = fabric.core_links()
+            recorded = RecordedRun(simulator)
+            resumed_from = 0
+        else:
+            changes = {link_name: {"bandwidth": params["bandwidth"], "delay": params["delay"]}
+                       for link_name in core_links}
+            resumed_from = recorded.resume_time(changes)
+            simulator = recorded.what_if(changes)
+        simulator.close()
+        result = dict(params)
+        result.update(summarize_run(simulator, core_links))
+        result["wall_time"] = time.perf_counter() - start
+        result["resumed_from"] = resumed_from
+        results.append(result)
+    return results
+
+
+def expand_grid(grid):
+    """{参数名: [取值, ...]} 展开为参数组合列表"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def run_sweep(grid, workload_file=DEFAULT_WORKLOAD, workers=None, cache_dir=DEFAULT_CACHE_DIR, incremental=False):
+    """
+    并行运行参数网格中的每一组参数
+    :param incremental: 按core链路参数以外的参数分组，组内用run_incremental复用第一次运行的前缀
+    :return: 结果表（每组参数一行的dict列表，顺序与expand_grid一致）
+    """
+    global _shared_workload
+    param_list = expand_grid(grid)
+    # 先在父进程中加载workload、建好拓扑索引，fork出的worker直接共享
+    _shared_workload = load_workload(workload_file, cache_dir)
+    for num in sorted({params.get("num", DEFAULT_PARAMS["num"]) for params in param_list}):
+        shared_topology(num, _shared_workload)
+    if incremental:
+        groups = {}
+        for i, params in enumerate(param_list):
+            key = tuple((name, params.get(name, DEFAULT_PARAMS[name])) for name in DEFAULT_PARAMS
+                        if name not in CORE_PARAMS)
+            groups.setdefault(key, []).append(i)
+        tasks = [[param_list[i] for i in indices] for indices in groups.values()]
+        function = run_incremental
+    else:
+        tasks = param_list
+        function = run_one
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        outputs = [function(task) for task in tasks]
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with context.Pool(workers, initializer=_init_worker, initargs=(workload_file, cache_dir)) as pool:
+            outputs = pool.map(function, tasks, chunksize=1)
+    if not incremental:
+        return outputs
+    results = [None] * len(param_list)
+    for indices, rows in zip(groups.values(), outputs):
+        for i, row in zip(indices, rows):
+            results[i] = row
+    return results
+
+
+def _t_95(df):
+    """自由度为df的t分布双侧95%分位数"""
+    if df < len(T_95):
+        return T_95[df]
+    return next(t for breakpoint, t in reversed(T_95_LARGE) if df >= breakpoint)
+
+
+def aggregate_seeds(results, metrics=ENSEMBLE_METRICS):
+    """
+    把同一配置不同种子的结果合并：按seed以外的参数分组，求各指标的均值、标准差和95%置信区间（t分布）
+    :return: 每个配置一行：参数、种子数、{指标}_mean/_std/_ci_low/_ci_high
+    """
+    groups = {}
+    for row in results:
+        key = tuple((name, row[name]) for name in DEFAULT_PARAMS if name != "seed")
+        groups.setdefault(key, []).append(row)
+    rows = []
+    for key, group in groups.items():
+        row = dict(key)
+        row["seeds"] = len(group)
+        for metric in metrics:
+            values = np.array([result[metric] for result in group], dtype=np.float64)
+            mean = values.mean()
+            std = values.std(ddof=1) if len(values) > 1 else 0.0
+            half = _t_95(len(values) - 1) * std / np.sqrt(len(values)) if len(values) > 1 else 0.0
+            row.update({f"{metric}_mean": float(mean), f"{metric}_std": float(std),
+                        f"{metric}_ci_low": float(mean - half), f"{metric}_ci_high": float(mean + half)})
+        rows.append(row)
+    return rows
+
+
+def write_results(results, output_file):
+    """结果表写为csv"""
+    if not results:
+        return
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并行参数扫描")
+    parser.add_argument("--num", type=int, nargs="+", default=[1])
+    parser.add_argument("--bandwidth", type=float, nargs="+", default=[10])
+    parser.add_argument("--delay", type=float, nargs="+", default=[2])
+    parser.add_argument("--host-bandwidth", type=float, nargs="+", default=[DEFAULT_PARAMS["host_bandwidth"]])
+    parser.add_argument("--fabric-bandwidth", type=float, nargs="+", default=[DEFAULT_PARAMS["fabric_bandwidth"]])
+    parser.add_argument("--rate-mode", nargs="+", default=[RATE_EQUAL_SHARE])
+    parser.add_argument("--routing", nargs="+", default=[ROUTING_STATIC], choices=ROUTING_MODES)
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD)
+    parser.add_argument("--seeds", type=int, default=1, help="每个配置用种子0..N-1各运行一次，并汇总均值和置信区间")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只有core带宽/时延不同的运行复用第一次运行在首个core流之前的部分")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="sweep_results.csv")
+    parser.add_argument("--ensemble-output", default="ensemble_results.csv")
+    args = parser.parse_args()
+
+    grid = {
+        "num": args.num,
+        "bandwidth": args.bandwidth,
+        "delay": args.delay,
+        "host_bandwidth": args.host_bandwidth,
+        "fabric_bandwidth": args.fabric_bandwidth,
+        "rate_mode": args.rate_mode,
+        "routing": args.routing,
+        "seed": list(range(args.seeds)),
+    }
+    results = run_sweep(grid, args.workload, args.workers, incremental=args.incremental)
+    write_results(results, args.output)
+    if args.seeds == 1:
+        for row in results:
+            print(f"num: {row['num']}, bandwidth: {row['bandwidth']}, delay: {row['delay']}, routing: {row['routing']}, "
+                  f"makespan: {row['makespan']:.6f}, core util: {row['core_util'] * 100:.2f}%")
+    else:
+        ensemble = aggregate_seeds(results)
+        write_results(ensemble, args.ensemble_output)
+        for row in ensemble:
+            print(f"num: {row['num']}, bandwidth: {row['bandwidth']}, delay: {row['delay']}, routing: {row['routing']}, "
+                  f"seeds: {row['seeds']}, "
+                  f"makespan: {row['makespan_mean']:.6f} [{row['makespan_ci_low']:.6f}, {row['makespan_ci_high']:.6f}], "
+                  f"core util: {row['core_util_mean'] * 100:.2f}% "
+                  f"[{row['core_util_ci_low'] * 100:.2f}%, {row['core_util_ci_high'] * 100:.2f}%]")
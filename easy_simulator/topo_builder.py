@@ -0,0 +1,185 @@
+# 链路角色
+ROLE_HOST_UP = "host_up"        # host->leaf
+ROLE_HOST_DOWN = "host_down"    # leaf->host
+ROLE_LEAF_UP = "leaf_up"        # leaf->spine
+ROLE_LEAF_DOWN = "leaf_down"    # spine->leaf
+ROLE_SPINE_UP = "spine_up"      # spine->core
+ROLE_SPINE_DOWN = "spine_down"  # core->spine
+CORE_ROLE_PREFIX = "core"
+
+
+def core_role(start_node, end_node):
+    """core级链路的角色，按方向区分（如 core_20_21 与 core_21_20，Clos拓扑中为 core_spine_core 等）"""
+    return f"{CORE_ROLE_PREFIX}_{start_node}_{end_node}"
+
+
+class Fabric:
+    """
+    拓扑构建结果：链路按整数id（从0开始，名称为 link{id+1}）保存端点、带宽、时延和角色，
+    再一次性批量登记到Topology和Simulator中
+    """
+    def __init__(self):
+        self.link_names = []        # 链路id -> 名称
+        self.link_ends = []         # 链路id -> (起点, 终点)
+        self.link_bandwidths = []   # 链路id -> 带宽（Gbps）
+        self.link_delays = []       # 链路id -> 时延（ms）
+        self.link_roles = []        # 链路id -> 角色
+        self.role_links = {}        # 角色 -> [链路id, ...]
+        self.hosts = []             # rank -> host节点名
+        self.num_nodes = 0
+
+    def new_nodes(self, count):
+        """分配count个节点名（连续整数的字符串，与workload中的rank编号方式一致）"""
+        nodes = [str(self.num_nodes + i) for i in range(count)]
+        self.num_nodes += count
+        return nodes
+
+    def add_link(self, start_node, end_node, bandwidth, delay, role):
+        link_id = len(self.link_names)
+        self.link_names.append(f"link{link_id + 1}")
+        self.link_ends.append((start_node, end_node))
+        self.link_bandwidths.append(bandwidth)
+        self.link_delays.append(delay)
+        self.link_roles.append(role)
+        self.role_links.setdefault(role, []).append(link_id)
+        return link_id
+
+    def add_duplex(self, lower, upper, bandwidth, delay, up_role, down_role, count=1):
+        """lower与upper之间添加count对双向链路（上行、下行交替）"""
+        for _ in range(count):
+            self.add_link(lower, upper, bandwidth, delay, up_role)
+            self.add_link(upper, lower, bandwidth, delay, down_role)
+
+    def links_with_role(self, *roles):
+        """指定角色的链路名称（按链路id排序）"""
+        link_ids = sorted(link_id for role in roles for link_id in self.role_links.get(role, []))
+        return [self.link_names[link_id] for link_id in link_ids]
+
+    def core_roles(self):
+        return [role for role in self.role_links if role.startswith(CORE_ROLE_PREFIX)]
+
+    def core_links(self):
+        return self.links_with_role(*self.core_roles())
+
+    def link_dict(self):
+        """{链路名称: (起点, 终点)}"""
+        return dict(zip(self.link_names, self.link_ends))
+
+    def register(self, simulator=None, topo=None):
+        """批量登记到仿真器和拓扑（为None的一方跳过）；两者应为空，链路id才与Fabric一致"""
+        if topo is not None:
+            topo.add_links((name, start, end) for name, (start, end) in zip(self.link_names, self.link_ends))
+        if simulator is not None:
+            simulator.add_links(zip(self.link_names, self.link_bandwidths, self.link_delays, self.link_roles))
+        return self
+
+
+def set_16_rank_topo(simulator, topo, num, bandwidth, delay,
+                     host_bandwidth=200, fabric_bandwidth=400, fabric_delay=0.05):
+    """
+    16 rank拓扑：两个leaf（16、17）各接8个host，leaf-spine、spine-core各4条并行链路，
+    两个core（20、21）之间num对并行链路
+    simulator或topo为None时只构建另一方（例如多次运行共用同一个已建好索引的拓扑）
+    :param bandwidth: core-core链路带宽（Gbps）
+    :param delay: core-core链路时延（ms）
+    :return: Fabric
+    """
+    fabric = Fabric()
+    fabric.hosts = fabric.new_nodes(16)
+    leaves = fabric.new_nodes(2)        # 16, 17
+    spines = fabric.new_nodes(2)        # 18, 19
+    cores = fabric.new_nodes(2)         # 20, 21
+    # host->leaf
+    for leaf_index, leaf in enumerate(leaves):
+        for host in fabric.hosts[leaf_index * 8:(leaf_index + 1) * 8]:
+            fabric.add_duplex(host, leaf, host_bandwidth, fabric_delay, ROLE_HOST_UP, ROLE_HOST_DOWN)
+
+    # leaf->spine, spine->core
+    for lower, upper, up_role, down_role in ((leaves, spines, ROLE_LEAF_UP, ROLE_LEAF_DOWN),
+                                             (spines, cores, ROLE_SPINE_UP, ROLE_SPINE_DOWN)):
+        for i in range(4):
+            for lower_node, upper_node in zip(lower, upper):
+                fabric.add_duplex(lower_node, upper_node, fabric_bandwidth, fabric_delay, up_role, down_role)
+
+    # core->core
+    fabric.add_duplex(cores[0], cores[1], bandwidth, delay,
+                      core_role(cores[0], cores[1]), core_role(cores[1], cores[0]), count=num)
+
+    return fabric.register(simulator, topo)
+
+
+def build_clos(simulator, topo, racks, hosts_per_rack, racks_per_pod=None, spines_per_pod=4, leaf_uplinks=1,
+               cores_per_plane=0, spine_uplinks=1, host_bandwidth=200, leaf_bandwidth=None, spine_bandwidth=None,
+               oversubscription=1, core_oversubscription=1, host_delay=0.05, fabric_delay=0.05, core_delay=None):
+    """
+    参数化的多级Clos/fat-tree拓扑
+    - 每个rack一个leaf，接hosts_per_rack个host；rank按rack顺序编号
+    - 每racks_per_pod个rack组成一个pod，pod内每个leaf与每个spine之间leaf_uplinks条并行链路
+    - cores_per_plane > 0 时为三级：第s个平面有cores_per_plane个core，
+      各pod的第s个spine与该平面的每个core之间spine_uplinks条并行链路
+    - cores_per_plane = 0 时为两级leaf-spine，此时只能有一个pod
+    - 最上一级链路（两级时为leaf-spine，三级时为spine-core）按方向使用core角色
+      （core_leaf_spine / core_spine_leaf 或 core_spine_core / core_core_spine），
+      Fabric.core_links()、轨迹中按core角色取链路和统计利用率都取这一级
+    未给出leaf_bandwidth/spine_bandwidth时按收敛比（下行总带宽/上行总带宽）推算
+    :return: Fabric
+    """
+    racks_per_pod = racks_per_pod or racks
+    if racks % racks_per_pod:
+        raise ValueError(f"racks({racks})必须是racks_per_pod({racks_per_pod})的整数倍")
+    pods = racks // racks_per_pod
+    if pods > 1 and cores_per_plane <= 0:
+        raise ValueError("多个pod需要core层（cores_per_plane > 0）")
+    if leaf_bandwidth is None:
+        leaf_bandwidth = hosts_per_rack * host_bandwidth / (spines_per_pod * leaf_uplinks * oversubscription)
+    if spine_bandwidth is None and cores_per_plane > 0:
+        spine_bandwidth = (racks_per_pod * leaf_uplinks * leaf_bandwidth
+                           / (cores_per_plane * spine_uplinks * core_oversubscription))
+    core_delay = fabric_delay if core_delay is None else core_delay
+
+    if cores_per_plane > 0:
+        leaf_roles = (ROLE_LEAF_UP, ROLE_LEAF_DOWN)
+        spine_roles = (core_role("spine", "core"), core_role("core", "spine"))
+    else:
+        leaf_roles = (core_role("leaf", "spine"), core_role("spine", "leaf"))
+        spine_roles = None
+
+    fabric = Fabric()
+    fabric.hosts = fabric.new_nodes(racks * hosts_per_rack)
+    leaves = fabric.new_nodes(racks)
+    spines = fabric.new_nodes(pods * spines_per_pod)
+    cores = fabric.new_nodes(spines_per_pod * cores_per_plane)
+
+    for rack, leaf in enumerate(leaves):
+        for host in fabric.hosts[rack * hosts_per_rack:(rack + 1) * hosts_per_rack]:
+            fabric.add_duplex(host, leaf, host_bandwidth, host_delay, ROLE_HOST_UP, ROLE_HOST_DOWN)
+
+    for pod in range(pods):
+        pod_spines = spines[pod * spines_per_pod:(pod + 1) * spines_per_pod]
+        for leaf in leaves[pod * racks_per_pod:(pod + 1) * racks_per_pod]:
+            for spine in pod_spines:
+                fabric.add_duplex(leaf, spine, leaf_bandwidth, fabric_delay, *leaf_roles, count=leaf_uplinks)
+        for plane, spine in enumerate(pod_spines):
+            for core in cores[plane * cores_per_plane:(plane + 1) * cores_per_plane]:
+                fabric.add_duplex(spine, core, spine_bandwidth, core_delay, *spine_roles, count=spine_uplinks)
+
+    return fabric.register(simulator, topo)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="构建Clos拓扑并按角色统计链路数")
+    parser.add_argument("racks", type=int)
+    parser.add_argument("hosts_per_rack", type=int)
+    parser.add_argument("--racks-per-pod", type=int)
+    parser.add_argument("--cores-per-plane", type=int, default=0)
+    args = parser.parse_args()
+
+    fabric = build_clos(None, None, args.racks, args.hosts_per_rack, racks_per_pod=args.racks_per_pod,
+                        cores_per_plane=args.cores_per_plane)
+    for role, link_ids in fabric.role_links.items():
+        print(f"{role}: {len(link_ids)}")
+    if not fabric.core_links():
+        raise SystemExit("没有core级链路")
+    print(f"core links: {len(fabric.core_links())}, core roles: {fabric.core_roles()}")
@@ -0,0 +1,195 @@
+import ast
+import glob
+import os
+
+import numpy as np
+
+from trace_writer import STREAM_LINK_LOAD, STREAM_LINK_UTIL, STREAM_RATE, FLOW_STATS_FILE
+
+
+def load_meta(trace_dir):
+    """读取名称表：{link_names, link_bandwidths, flow_names, task_names}"""
+    with np.load(os.path.join(trace_dir, "meta.npz")) as meta:
+        return {key: meta[key] for key in meta.files}
+
+
+def load_stream(trace_dir, stream):
+    """按分块顺序读取并拼接一个记录流，返回 {列名: 数组}"""
+    chunks = []
+    for chunk_path in sorted(glob.glob(os.path.join(trace_dir, f"{stream}_*.npz"))):
+        with np.load(chunk_path) as chunk:
+            chunks.append({key: chunk[key] for key in chunk.files})
+    if not chunks:
+        return {}
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def _snapshots(time, column, value, num_columns):
+    """
+    按记录顺序把（时间, 列, 值）变化记录展开为完整快照，时间相同的相邻记录合并为一行，
+    同一行内后写入的值覆盖先写入的值，未变化的列沿用上一行的值（初始为0）
+    column为-1的记录只占行、不写值
+    """
+    if not len(time):
+        return np.zeros(0), np.zeros((0, num_columns))
+    new_row = np.ones(len(time), dtype=bool)
+    new_row[1:] = time[1:] != time[:-1]
+    row_index = np.cumsum(new_row) - 1
+    times = time[new_row]
+    snapshots = np.full((len(times), num_columns), np.nan)
+    selected = column >= 0
+    snapshots[row_index[selected], column[selected]] = value[selected]
+    last_row = np.where(np.isnan(snapshots), 0, np.arange(len(times))[:, None])
+    np.maximum.accumulate(last_row, axis=0, out=last_row)
+    snapshots = snapshots[last_row, np.arange(num_columns)]
+    return times, np.nan_to_num(snapshots, nan=0.0)
+
+
+def rebuild_link_snapshots(trace_dir, stream=STREAM_LINK_LOAD):
+    """
+    由只含变化链路的记录重建完整快照
+    :return: (时间数组[T], 数值矩阵[T, 链路数])，第i行为time[i]时刻所有链路的值
+    """
+    assert stream in (STREAM_LINK_LOAD, STREAM_LINK_UTIL)
+    num_links = len(load_meta(trace_dir)["link_names"])
+    data = load_stream(trace_dir, stream)
+    if not data:
+        return np.zeros(0), np.zeros((0, num_links))
+    return _snapshots(data["time"], data["link"], data["value"], num_links)
+
+
+class LinkTraceIndex:
+    """
+    链路负载/利用率轨迹的索引：轨迹只读一遍，按链路分组为CSR结构
+    （每条链路的变化点在 offsets[i]:offsets[i+1] 区间内，保持记录顺序）
+    """
+    def __init__(self, time, link, value, link_names, link_roles=None):
+        self.link_names = list(link_names)
+        self.link_roles = list(link_roles) if link_roles is not None else [""] * len(self.link_names)
+        self.link_ids = {name: i for i, name in enumerate(self.link_names)}
+        # 保留原始记录顺序，用于多链路快照
+        self.time = time
+        self.link = link
+        self.value = value
+        order, self.offsets = _group_by(link, len(self.link_names))
+        self.sorted_time = time[order]
+        self.sorted_value = value[order]
+
+    @classmethod
+    def from_trace(cls, trace_dir, stream=STREAM_LINK_LOAD):
+        """从二进制轨迹建立索引"""
+        assert stream in (STREAM_LINK_LOAD, STREAM_LINK_UTIL)
+        meta = load_meta(trace_dir)
+        data = load_stream(trace_dir, stream)
+        if not data:
+            data = {"time": np.zeros(0), "link": np.zeros(0, dtype=np.int32), "value": np.zeros(0)}
+        return cls(data["time"], data["link"], data["value"], meta["link_names"].tolist(),
+                   meta["link_roles"].tolist() if "link_roles" in meta else None)
+
+    @classmethod
+    def from_text(cls, file_path):
+        """从文本轨迹（_link_load.txt / _link_util.txt）建立索引，每行只解析一次"""
+        link_ids = {}
+        time, link, value = [], [], []
+        with open(file_path, "r") as f:
+            for line in f:
+                data = ast.literal_eval(line.strip())
+                for link_name, link_value in data["link"].items():
+                    time.append(data["time"])
+                    link.append(link_ids.setdefault(link_name, len(link_ids)))
+                    value.append(link_value)
+        return cls(np.array(time, dtype=np.float64), np.array(link, dtype=np.int64),
+                   np.array(value, dtype=np.float64), list(link_ids))
+
+    def links_with_role(self, role_filter):
+        """角色满足role_filter(role)的链路名称"""
+        return [name for name, role in zip(self.link_names, self.link_roles) if role_filter(role)]
+
+    def series(self, link_name, start=None, end=None):
+        """单条链路在[start, end]内的变化点 (时间数组, 数值数组)，链路不存在时为空"""
+        link_id = self.link_ids.get(link_name)
+        if link_id is None:
+            return np.zeros(0), np.zeros(0)
+        begin, stop = self.offsets[link_id], self.offsets[link_id + 1]
+        times = self.sorted_time[begin:stop]
+        values = self.sorted_value[begin:stop]
+        mask = _time_mask(times, start, end)
+        return times[mask], values[mask]
+
+    def snapshots(self, link_names, start=None, end=None):
+        """
+        指定链路在[start, end]内的完整快照，行与全部链路的快照一致
+        :return: (时间数组[T], 数值矩阵[T, len(link_names)])
+        """
+        link_ids = np.array([self.link_ids.get(name, -1) for name in link_names], dtype=np.int64)
+        column_of = np.full(len(self.link_names), -1, dtype=np.int64)
+        column_of[link_ids[link_ids >= 0]] = np.nonzero(link_ids >= 0)[0]
+        times, snapshots = _snapshots(self.time, column_of[self.link], self.value, len(link_names))
+        mask = _time_mask(times, start, end)
+        return times[mask], snapshots[mask]
+
+    def mean_over_links(self, link_names, start=None, end=None):
+        """指定链路在各时刻的平均值 (时间数组, 平均值数组)"""
+        times, snapshots = self.snapshots(link_names, start, end)
+        if not len(link_names):
+            return times, np.zeros(len(times))
+        return times, snapshots.mean(axis=1)
+
+
+class FlowTraceIndex:
+    """
+    逐流的速率变化索引和统计：速率轨迹只读一遍并按流分组（CSR结构），
+    统计列（开始/结束时间、FCT、slowdown、已发送量，见Simulator.flow_stats）直接按流id取
+    """
+    def __init__(self, flow_names, time, flow, value, stats=None):
+        self.flow_names = list(flow_names)
+        self.flow_ids = {name: i for i, name in enumerate(self.flow_names)}
+        order, self.offsets = _group_by(flow, len(self.flow_names))
+        self.sorted_time = time[order]
+        self.sorted_value = value[order]
+        self.stats = stats or {}
+
+    @classmethod
+    def from_trace(cls, trace_dir):
+        meta = load_meta(trace_dir)
+        data = load_stream(trace_dir, STREAM_RATE)
+        if not data:
+            data = {"time": np.zeros(0), "flow": np.zeros(0, dtype=np.int32), "value": np.zeros(0)}
+        return cls(meta["flow_names"].tolist(), data["time"], data["flow"], data["value"],
+                   load_flow_stats(trace_dir))
+
+    def rates(self, flow_name):
+        """流的速率变化序列 (时间数组, 速率数组Gbps)，按记录顺序"""
+        flow_id = self.flow_ids[flow_name]
+        begin, stop = self.offsets[flow_id], self.offsets[flow_id + 1]
+        return self.sorted_time[begin:stop], self.sorted_value[begin:stop]
+
+    def record(self, flow_name):
+        """流的统计 {列名: 值}"""
+        flow_id = self.flow_ids[flow_name]
+        return {name: column[flow_id].item() for name, column in self.stats.items()}
+
+
+def load_flow_stats(trace_dir):
+    """读取逐流统计 {列名: 数组}（下标为流整数id），没有时返回空dict"""
+    path = os.path.join(trace_dir, FLOW_STATS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _group_by(key, num_groups):
+    """按key稳定排序分组，返回 (排序下标, 各组起止偏移[num_groups + 1])"""
+    order = np.argsort(key, kind="stable")
+    counts = np.bincount(key, minlength=num_groups)
+    return order, np.concatenate(([0], np.cumsum(counts)))
+
+
+def _time_mask(times, start, end):
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times <= end
+    return mask
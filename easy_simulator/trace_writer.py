@@ -0,0 +1,390 @@
+import glob
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+from observer import (FLOW_START, FLOW_END, TASK_START, TASK_END, OBJECT_EVENTS, RATE_CHANGE, LINK_LOAD,
+                      LINK_UTIL)
+
+# 记录流的编号
+STREAM_RECORDS = "records"
+STREAM_LINK_LOAD = "link_load"
+STREAM_LINK_UTIL = "link_util"
+STREAM_RATE = "rate"
+
+# 逐流统计文件（轨迹目录下，每列下标为流整数id）
+FLOW_STATS_FILE = "flows.npz"
+
+KIND_FLOW = 0
+KIND_TASK = 1
+STATUS_BEGIN = 0
+STATUS_FINISH = 1
+
+_TEXT_SUFFIXES = {
+    STREAM_RECORDS: "records",
+    STREAM_LINK_LOAD: "link_load",
+    STREAM_LINK_UTIL: "link_util",
+    STREAM_RATE: "rate_record",
+}
+
+_KIND_NAMES = {KIND_FLOW: "Flow", KIND_TASK: "Task"}
+# 订阅的事件类型 -> (kind, status)
+_OBJECT_EVENT_CODES = {
+    FLOW_START: (KIND_FLOW, STATUS_BEGIN),
+    FLOW_END: (KIND_FLOW, STATUS_FINISH),
+    TASK_START: (KIND_TASK, STATUS_BEGIN),
+    TASK_END: (KIND_TASK, STATUS_FINISH),
+}
+_STATUS_NAMES = {STATUS_BEGIN: "begin", STATUS_FINISH: "finish"}
+
+
+def _copy_prefix(source, target, size):
+    """把source的前size个字节拷贝为target"""
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while size > 0:
+            data = src.read(min(size, 1 << 20))
+            if not data:
+                break
+            dst.write(data)
+            size -= len(data)
+
+
+def _restore_chunks(source_dir, target_dir, chunk_indices):
+    """target_dir中只保留各记录流编号小于chunk_indices[stream]的分块，缺少的从source_dir拷贝"""
+    same_dir = os.path.abspath(source_dir) == os.path.abspath(target_dir)
+    for chunk_path in glob.glob(os.path.join(target_dir, "*.npz")):
+        stream, _, chunk_index = os.path.basename(chunk_path)[:-len(".npz")].rpartition("_")
+        if not same_dir or stream not in chunk_indices or int(chunk_index) >= chunk_indices[stream]:
+            os.remove(chunk_path)
+    if same_dir:
+        return
+    for stream, count in chunk_indices.items():
+        for chunk_index in range(count):
+            chunk_name = f"{stream}_{chunk_index:05d}.npz"
+            shutil.copyfile(os.path.join(source_dir, chunk_name), os.path.join(target_dir, chunk_name))
+
+
+class TraceSampling:
+    """
+    链路负载/利用率和流速率记录的采样设置（流/任务的开始结束记录不采样）
+    - interval: 每隔interval（秒，仿真时间）才写一次，期间变化的值只保留最新的，到点时一并写出
+    - epsilon: 只写相对上次写出的值变化超过epsilon（相对值）的链路/流
+    - links / flows: 只记录这些名称的链路 / 流，None表示全部
+    """
+    def __init__(self, interval=None, epsilon=None, links=None, flows=None):
+        self.interval = interval
+        self.epsilon = epsilon
+        self.links = set(links) if links is not None else None
+        self.flows = set(flows) if flows is not None else None
+
+
+def _copy(value):
+    return dict(value) if isinstance(value, dict) else list(value) if isinstance(value, list) else value
+
+
+class _ColumnBuffer:
+    """按列缓存记录，攒满一块后写成一个npz分块"""
+    def __init__(self, columns):
+        # columns: [(列名, array类型码), ...]
+        self.columns = [(name, array(code)) for name, code in columns]
+        self.chunk_index = 0
+
+    def __len__(self):
+        return len(self.columns[0][1])
+
+    def append(self, *values):
+        for (_, col), value in zip(self.columns, values):
+            col.append(value)
+
+    def take(self):
+        """取出缓存中的全部数据（numpy数组）并清空缓存"""
+        data = {name: np.array(col) for name, col in self.columns}
+        for _, col in self.columns:
+            del col[:]
+        return data
+
+
+class TraceWriter:
+    """
+    仿真轨迹输出：每个文件只打开一次，记录先缓存在内存中。
+    二进制输出为列式npz分块（{file_name}_trace/{stream}_{chunk}.npz），
+    流/任务/链路名称统一编码为整数id，名称表写入meta.npz；
+    文本输出（records/link_load/link_util/rate_record.txt）为可选导出。
+    """
+    def __init__(self, file_name, binary=True, text=False, chunk_size=1 << 16, resume_state=None, sampling=None):
+        """
+        resume_state: 从checkpoint恢复时的写出状态（见state/resume），此时接着已有轨迹继续写
+        sampling: 采样设置（TraceSampling），None时记录全部变化
+        """
+        self.file_name = file_name
+        self.binary = binary
+        self.text = text
+        self.chunk_size = chunk_size
+        self.sampling = sampling
+
+        self.link_names = []            # link_index -> 链路名
+        self.link_bandwidths = []       # link_index -> 带宽（Gbps）
+        self.link_roles = []            # link_index -> 链路角色（见topo_builder），未知为""
+        self.object_names = {KIND_FLOW: [], KIND_TASK: []}  # kind -> [名称]，下标即整数id
+        # 采样状态（各记录流分别维护）
+        self.selected = {STREAM_LINK_LOAD: [], STREAM_LINK_UTIL: [], STREAM_RATE: []}  # id -> 是否记录
+        self.last_values = {stream: {} for stream in self.selected}     # id -> 上次写出的值
+        self.pending = {stream: {} for stream in self.selected}         # id -> 等待下次采样写出的值
+        self.pending_time = {stream: None for stream in self.selected}  # 最近一次收到记录的时间
+        self.next_sample = {stream: float('-inf') for stream in self.selected}
+
+        self.buffers = {
+            STREAM_RECORDS: _ColumnBuffer([("kind", "b"), ("id", "i"), ("status", "b"), ("time", "d")]),
+            STREAM_LINK_LOAD: _ColumnBuffer([("time", "d"), ("link", "i"), ("value", "d")]),
+            STREAM_LINK_UTIL: _ColumnBuffer([("time", "d"), ("link", "i"), ("value", "d")]),
+            STREAM_RATE: _ColumnBuffer([("time", "d"), ("flow", "i"), ("value", "d")]),
+        }
+        if resume_state is not None:
+            self.link_names = list(resume_state["link_names"])
+            self.link_bandwidths = list(resume_state["link_bandwidths"])
+            self.link_roles = list(resume_state["link_roles"])
+            self.object_names = {kind: list(names) for kind, names in resume_state["object_names"].items()}
+            self.sampling = resume_state["sampling"]
+            for name in ("selected", "last_values", "pending", "pending_time", "next_sample"):
+                setattr(self, name, {stream: _copy(value) for stream, value in resume_state[name].items()})
+            for stream, chunk_index in resume_state["chunk_indices"].items():
+                self.buffers[stream].chunk_index = chunk_index
+
+        self.trace_dir = f"{file_name}_trace"
+        if self.binary:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            if resume_state is None:
+                for old_chunk in glob.glob(os.path.join(self.trace_dir, "*.npz")):
+                    os.remove(old_chunk)
+            else:
+                # 保留（或从原轨迹拷贝）checkpoint之前写出的分块，删除之后写出的分块
+                _restore_chunks(f"{resume_state['file_name']}_trace", self.trace_dir,
+                                resume_state["chunk_indices"])
+
+        self.text_files = {}
+        if self.text:
+            buffering = 1 << 20
+            for stream, suffix in _TEXT_SUFFIXES.items():
+                path = f"{file_name}_{suffix}.txt"
+                if resume_state is None:
+                    self.text_files[stream] = open(path, "w", buffering=buffering)
+                    continue
+                # 截断到checkpoint时的位置后接着写；换了文件名时先拷贝前缀
+                offset = resume_state["text_offsets"][stream]
+                source = f"{resume_state['file_name']}_{suffix}.txt"
+                if os.path.abspath(source) != os.path.abspath(path):
+                    _copy_prefix(source, path, offset)
+                file = open(path, "r+", buffering=buffering)
+                file.seek(offset)
+                file.truncate()
+                self.text_files[stream] = file
+        self.closed = False
+
+    @classmethod
+    def resume(cls, state, file_name=None):
+        """按state恢复写出器；file_name与原来不同时，把checkpoint之前的轨迹拷贝到新文件名下"""
+        return cls(file_name or state["file_name"], state["binary"], state["text"], state["chunk_size"],
+                   resume_state=state, sampling=state["sampling"])
+
+    def state(self):
+        """写盘并返回可用于resume的写出状态"""
+        self.flush()
+        return {
+            "file_name": self.file_name,
+            "binary": self.binary,
+            "text": self.text,
+            "chunk_size": self.chunk_size,
+            "link_names": list(self.link_names),
+            "link_bandwidths": list(self.link_bandwidths),
+            "link_roles": list(self.link_roles),
+            "object_names": {kind: list(names) for kind, names in self.object_names.items()},
+            "sampling": self.sampling,
+            "selected": {stream: list(value) for stream, value in self.selected.items()},
+            "last_values": {stream: dict(value) for stream, value in self.last_values.items()},
+            "pending": {stream: dict(value) for stream, value in self.pending.items()},
+            "pending_time": dict(self.pending_time),
+            "next_sample": dict(self.next_sample),
+            "chunk_indices": {stream: buffer.chunk_index for stream, buffer in self.buffers.items()},
+            "text_offsets": {stream: file.tell() for stream, file in self.text_files.items()},
+        }
+
+    # ---------- id 编码 ----------
+    def register_link(self, link_name, bandwidth, role=None):
+        """登记链路，返回其整数id"""
+        self.link_names.append(link_name)
+        self.link_bandwidths.append(bandwidth)
+        self.link_roles.append(role or "")
+        selected = self.sampling is None or self.sampling.links is None or link_name in self.sampling.links
+        self.selected[STREAM_LINK_LOAD].append(selected)
+        self.selected[STREAM_LINK_UTIL].append(selected)
+        return len(self.link_names) - 1
+
+    def register_object(self, kind, name):
+        """登记流或任务，返回其整数id"""
+        self.object_names[kind].append(name)
+        if kind == KIND_FLOW:
+            self.selected[STREAM_RATE].append(
+                self.sampling is None or self.sampling.flows is None or name in self.sampling.flows)
+        return len(self.object_names[kind]) - 1
+
+    # ---------- 订阅 ----------
+    def observe(self, simulator):
+        """作为simulator的内置订阅者：把流/任务开始结束、速率变化、链路负载和利用率写入轨迹"""
+        simulator.subscribe(self._on_object_event, OBJECT_EVENTS)
+        simulator.subscribe(self._on_rate_change, (RATE_CHANGE,))
+        simulator.subscribe(self._on_link_load, (LINK_LOAD,))
+        simulator.subscribe(self._on_link_util, (LINK_UTIL,))
+
+    def _on_object_event(self, record):
+        kind, status = _OBJECT_EVENT_CODES[record.event]
+        self.record_event(kind, record.obj.index, status, record.time)
+
+    def _on_rate_change(self, record):
+        self.record_rates(record.time, [(flow.index, rate) for flow, rate in record.values])
+
+    def _on_link_load(self, record):
+        self.record_link_load(record.time, [(link.index, load) for link, load in record.values])
+
+    def _on_link_util(self, record):
+        self.record_link_util(record.time, [(link.index, util) for link, util in record.values])
+
+    # ---------- 记录 ----------
+    def record_event(self, kind, obj_id, status, time):
+        """流/任务的开始或结束"""
+        if self.binary:
+            self._append(STREAM_RECORDS, kind, obj_id, status, time)
+        if self.text:
+            self.text_files[STREAM_RECORDS].write(
+                f"{_KIND_NAMES[kind]},{self.object_names[kind][obj_id]},{_STATUS_NAMES[status]},{time}\n")
+
+    def record_link_load(self, time, link_values):
+        """链路负载快照，link_values: [(link_index, 负载Gbps), ...]"""
+        self._record_link_values(STREAM_LINK_LOAD, time, link_values)
+
+    def record_link_util(self, time, link_values):
+        """链路利用率快照，link_values: [(link_index, 利用率), ...]"""
+        self._record_link_values(STREAM_LINK_UTIL, time, link_values)
+
+    def record_rates(self, time, flow_rates):
+        """流速率变化，flow_rates: [(flow整数id, 速率Gbps), ...]"""
+        if self.sampling is not None:
+            flow_rates = self._sample(STREAM_RATE, time, flow_rates)
+            if not flow_rates:
+                return
+        self._write_rates(time, flow_rates)
+
+    def _write_rates(self, time, flow_rates):
+        if self.binary:
+            for flow_index, rate in flow_rates:
+                self._append(STREAM_RATE, time, flow_index, rate)
+        if self.text:
+            flow_names = self.object_names[KIND_FLOW]
+            rate_dict = {
+                "time": time,
+                "flow": {flow_names[flow_index]: rate for flow_index, rate in flow_rates}
+            }
+            self.text_files[STREAM_RATE].write(f"{rate_dict}\n")
+
+    def _record_link_values(self, stream, time, link_values):
+        if self.sampling is not None:
+            link_values = self._sample(stream, time, link_values)
+            if not link_values:
+                return
+        self._write_link_values(stream, time, link_values)
+
+    def _write_link_values(self, stream, time, link_values):
+        if self.binary:
+            for link_index, value in link_values:
+                self._append(stream, time, link_index, value)
+        if self.text:
+            value_dict = {
+                "time": time,
+                "link": {self.link_names[link_index]: value for link_index, value in link_values}
+            }
+            self.text_files[stream].write(f"{value_dict}\n")
+
+    def _sample(self, stream, time, values):
+        """按采样设置过滤一次记录，返回需要在time写出的 [(id, 值), ...]"""
+        selected = self.selected[stream]
+        values = [(index, value) for index, value in values if selected[index]]
+        interval = self.sampling.interval
+        if interval is not None:
+            pending = self.pending[stream]
+            pending.update(values)
+            self.pending_time[stream] = time
+            if time < self.next_sample[stream]:
+                return []
+            self.next_sample[stream] = time + interval
+            values = list(pending.items())
+            pending.clear()
+        epsilon = self.sampling.epsilon
+        if epsilon is not None:
+            last_values = self.last_values[stream]
+            sampled = []
+            for index, value in values:
+                last = last_values.get(index, 0)
+                if abs(value - last) > epsilon * abs(last):
+                    last_values[index] = value
+                    sampled.append((index, value))
+            values = sampled
+        return values
+
+    def _flush_pending(self):
+        """写出按间隔采样时尚未到点的最新值"""
+        for stream, pending in self.pending.items():
+            if not pending:
+                continue
+            time = self.pending_time[stream]
+            self.next_sample[stream] = float('-inf')
+            values = self._sample(stream, time, [])
+            if not values:
+                continue
+            if stream == STREAM_RATE:
+                self._write_rates(time, values)
+            else:
+                self._write_link_values(stream, time, values)
+
+    def _append(self, stream, *values):
+        buffer = self.buffers[stream]
+        buffer.append(*values)
+        if len(buffer) >= self.chunk_size:
+            self._flush_stream(stream)
+
+    def write_flow_stats(self, columns):
+        """逐流统计，columns: {列名: 数组}，数组下标为流整数id"""
+        if self.binary:
+            np.savez(os.path.join(self.trace_dir, FLOW_STATS_FILE), **columns)
+
+    # ---------- 落盘 ----------
+    def _flush_stream(self, stream):
+        buffer = self.buffers[stream]
+        if not len(buffer):
+            return
+        chunk_path = os.path.join(self.trace_dir, f"{stream}_{buffer.chunk_index:05d}.npz")
+        np.savez(chunk_path, **buffer.take())
+        buffer.chunk_index += 1
+
+    def flush(self):
+        """把缓存中的全部记录写盘"""
+        if self.binary:
+            for stream in self.buffers:
+                self._flush_stream(stream)
+            np.savez(os.path.join(self.trace_dir, "meta.npz"),
+                     link_names=np.array(self.link_names, dtype=str),
+                     link_bandwidths=np.array(self.link_bandwidths, dtype=np.float64),
+                     link_roles=np.array(self.link_roles, dtype=str),
+                     flow_names=np.array(self.object_names[KIND_FLOW], dtype=str),
+                     task_names=np.array(self.object_names[KIND_TASK], dtype=str))
+        for file in self.text_files.values():
+            file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self._flush_pending()
+        self.flush()
+        for file in self.text_files.values():
+            file.close()
+        self.closed = True
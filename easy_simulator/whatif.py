@@ -0,0 +1,136 @@
+import bisect
+import math
+import pickle
+
+from simulator import Simulator
+
+SNAPSHOT_BATCHES = 256      # 基准运行每处理多少批事件保存一次内存快照
+
+
+class RecordedRun:
+    """
+    记录一次基准运行，用于参数修改后的增量重仿真（what-if）：
+    运行中每隔snapshot_batches批事件保存一次内存快照（checkpoint_state），
+    运行结束后统计每条链路最早被流使用的时间（动态选路的流按其全部候选链路计）。
+    只修改若干链路的带宽/时延时，最早使用这些链路的流开始之前的所有事件都与参数无关，
+    what_if从分歧点之前恢复，只仿真之后的部分
+    """
+    def __init__(self, simulator, snapshot_batches=SNAPSHOT_BATCHES):
+        """运行simulator（尚未run的仿真器）直到结束"""
+        self.simulator = simulator
+        self.snapshot_batches = snapshot_batches
+        self.snapshot_times = []    # 各快照之前已处理批次的最大时间（单调不减）
+        self.snapshots = []         # pickle后的checkpoint_state
+        self.refined = {}           # 分歧时间 -> 恰好在其之前的快照（见_snapshot_before）
+        self.batches = 0
+        self._run()
+        self.first_use = self._first_use()
+
+    def _snapshot(self, max_time):
+        self.snapshot_times.append(max_time)
+        self.snapshots.append(pickle.dumps(self.simulator.checkpoint_state(), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _run(self):
+        simulator = self.simulator
+        max_time = float('-inf')
+        while True:
+            if self.batches % self.snapshot_batches == 0:
+                self._snapshot(max_time)
+            event = simulator.pop_event()
+            if event is None:
+                break
+            simulator.process_batch(event)
+            self.batches += 1
+            max_time = max(max_time, simulator.current_time)    # 时间可能倒退，按已处理的最大时间判断
+        simulator.flush_subscriptions()
+        if simulator.trace is not None:
+            simulator.trace.flush()
+        # 结束时的快照：修改的链路没有被任何流使用时直接从这里恢复
+        self._snapshot(max_time)
+
+    def _first_use(self):
+        """链路名称 -> 最早开始的使用该链路的流的开始时间"""
+        simulator = self.simulator
+        link_names = {id(link): link_name for link_name, link in simulator.links.items()}
+        router = simulator.router
+        first_use = {}
+        for flow in simulator.flows.values():
+            if flow.start_time is None:
+                continue
+            if flow.route is not None and router is not None:
+                # 动态选路：候选链路的带宽变化可能改变选路结果
+                links = {router.links[link_id] for groups in router.topo.ecmp(*flow.route).hop_groups
+                         for group in groups for link_id in group}
+            else:
+                links = flow.path
+            for link in links:
+                link_name = link_names[id(link)]
+                if flow.start_time < first_use.get(link_name, float('inf')):
+                    first_use[link_name] = flow.start_time
+        return first_use
+
+    def divergence_time(self, link_names):
+        """修改这些链路后最早可能不同的事件时间，没有流使用这些链路时为inf"""
+        return min((self.first_use.get(link_name, float('inf')) for link_name in link_names), default=float('inf'))
+
+    def resume_time(self, link_names, keep_trace=False):
+        """修改这些链路时重新仿真的起始时间（之前的部分直接复用）"""
+        return pickle.loads(self._snapshot_before(self.divergence_time(link_names), keep_trace))["current_time"]
+
+    def _snapshot_before(self, diverge, keep_trace):
+        """
+        之前处理过的批次都早于diverge的快照。
+        不需要沿用基准轨迹时，从最近的周期快照运行到diverge之前再保存一个精确快照（按diverge缓存），
+        同一分歧点的后续what-if直接从这里恢复
+        """
+        position = bisect.bisect_left(self.snapshot_times, diverge) - 1
+        if keep_trace or self.snapshot_times[position] == self.snapshot_times[-1]:
+            return self.snapshots[position]
+        refined = self.refined.get(diverge)
+        if refined is None:
+            state = pickle.loads(self.snapshots[position])
+            simulator = Simulator.from_checkpoint_state(state, trace=False, topo=self._topo())
+            simulator.run(until=math.nextafter(diverge, -math.inf))
+            refined = pickle.dumps(simulator.checkpoint_state(), protocol=pickle.HIGHEST_PROTOCOL)
+            self.refined[diverge] = refined
+        return refined
+
+    def _topo(self):
+        router = self.simulator.router
+        return router.topo if router is not None else None
+
+    def what_if(self, link_changes, file_name=None, trace=None, topo=None):
+        """
+        修改链路参数后重新仿真，只重新执行分歧点之后的部分
+        :param link_changes: {链路名称: {"bandwidth": Gbps, "delay": ms}}，只需给出修改的项
+        :param file_name: 给出时把基准运行在快照之前的轨迹拷贝到该文件名下接着写（只能从周期快照恢复），
+                          默认不写轨迹文件
+        :param trace: 自定义的新轨迹写出器（优先于file_name，只包含恢复之后的记录），False表示不写
+        :param topo: 同Simulator.load_checkpoint，使用动态选路时默认取基准运行的router的拓扑
+        :return: 运行结束（未close）的仿真器
+        """
+        unknown = set(link_changes) - set(self.simulator.links)
+        if unknown:
+            raise KeyError(f"未知的链路: {sorted(unknown)}")
+        keep_trace = trace is None and file_name is not None
+        state = pickle.loads(self._snapshot_before(self.divergence_time(link_changes), keep_trace))
+
+        links = []
+        for i, (link_id, bandwidth, delay, load) in enumerate(state["links"]):
+            change = link_changes.get(link_id)
+            if change:
+                bandwidth = change.get("bandwidth", bandwidth)
+                delay = change.get("delay", delay)
+                if state["trace"] is not None:
+                    state["trace"]["link_bandwidths"][i] = bandwidth
+                state["link_stats"]["bandwidths"][i] = bandwidth
+            links.append((link_id, bandwidth, delay, load))
+        state["links"] = links
+
+        if trace is None and file_name is None:
+            trace = False
+        if topo is None:
+            topo = self._topo()
+        simulator = Simulator.from_checkpoint_state(state, file_name, trace, topo)
+        simulator.run()
+        return simulator
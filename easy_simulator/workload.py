@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from router import ROUTING_STATIC, make_router
+
+OP_GPU = 0
+OP_SEND = 1
+_OP_TYPES = {"gpu": OP_GPU, "send": OP_SEND}
+
+UNRESOLVED_DEPENDENCY = -2      # 依赖的op不在workload中（该op永远不会被触发）
+
+# 编译格式变化时递增，旧缓存自动失效
+COMPILED_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = ".workload_cache"
+
+
+def iter_workload_entries(workload_file, chunk_size=1 << 20):
+    """
+    流式读取workload顶层数组中的条目（每个条目形如 {"ops": [...]}），
+    每次只解码一个条目，不需要把整个文件读进内存
+    """
+    decoder = json.JSONDecoder()
+    with open(workload_file, "r") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # 跳过空白、分隔符和开头的 '['
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","
+                                         or (not started and buffer[pos] == "[")):
+                if buffer[pos] == "[":
+                    started = True
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            if pos < len(buffer):
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield entry
+                    pos = end
+                    continue
+            elif eof:
+                return
+            # 数据不足以解码一个完整条目，继续读
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def iter_ops(workload_file):
+    """按workload中的顺序逐个产出op"""
+    for entry in iter_workload_entries(workload_file):
+        for op in entry["ops"]:
+            yield op
+
+
+class CompiledWorkload:
+    """
+    编译后的workload：op名称解析为整数id，依赖解析为被依赖op的id
+    各数组下标即op id，顺序与原始workload一致；
+    op i的依赖为 dep_ids[dep_offsets[i]:dep_offsets[i + 1]]（CSR结构，一个op可以有多个依赖）
+    """
+    def __init__(self, names, op_type, amount, src_rank, dst_rank, dep_offsets, dep_ids, unresolved):
+        self.names = names              # op id -> op名称
+        self.op_type = op_type          # OP_GPU / OP_SEND
+        self.amount = amount            # gpu：计算时间（秒）；send：数据量（MB）
+        self.src_rank = src_rank        # send的源rank，gpu为-1
+        self.dst_rank = dst_rank        # send的目的rank，gpu为-1
+        self.dep_offsets = dep_offsets  # op id -> 依赖在dep_ids中的起始位置（长度为op数+1）
+        self.dep_ids = dep_ids          # 被依赖op的id，不在workload中的为UNRESOLVED_DEPENDENCY
+        self.unresolved = unresolved    # {op id: [未解析的依赖名称, ...]}（与dep_ids中的顺序一致）
+
+    def __len__(self):
+        return len(self.names)
+
+    def dependency_names(self, op_id):
+        """op的全部依赖名称"""
+        unresolved = iter(self.unresolved.get(op_id, ()))
+        return [next(unresolved) if dep == UNRESOLVED_DEPENDENCY else self.names[dep]
+                for dep in self.dep_ids[self.dep_offsets[op_id]:self.dep_offsets[op_id + 1]].tolist()]
+
+    def save(self, path):
+        unresolved_ids = [op_id for op_id, names in self.unresolved.items() for _ in names]
+        unresolved_names = [name for names in self.unresolved.values() for name in names]
+        np.savez(path, names=np.array(self.names, dtype=str), op_type=self.op_type,
+                 amount=self.amount, src_rank=self.src_rank, dst_rank=self.dst_rank,
+                 dep_offsets=self.dep_offsets, dep_ids=self.dep_ids,
+                 unresolved_ids=np.array(unresolved_ids, dtype=np.int64),
+                 unresolved_names=np.array(unresolved_names, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            unresolved = {}
+            for op_id, name in zip(data["unresolved_ids"].tolist(), data["unresolved_names"].tolist()):
+                unresolved.setdefault(op_id, []).append(name)
+            return cls(data["names"].tolist(), data["op_type"], data["amount"], data["src_rank"],
+                       data["dst_rank"], data["dep_offsets"], data["dep_ids"], unresolved)
+
+
+def compile_workload(workload_file):
+    """流式读取workload并编译"""
+    names = []
+    op_type = []
+    amount = []
+    src_rank = []
+    dst_rank = []
+    depends = []
+    for op in iter_ops(workload_file):
+        kind = _OP_TYPES.get(op["op_type"])
+        if kind is None:
+            continue
+        names.append(op["op_name"])
+        op_type.append(kind)
+        if kind == OP_GPU:
+            amount.append(op["duration"] / 1000)    # ms转秒
+            src_rank.append(-1)
+            dst_rank.append(-1)
+        else:
+            amount.append(op["size"])
+            src_rank.append(op["src_rank"])
+            dst_rank.append(op["dst_rank"])
+        # depends可以是单个名称或名称列表，空字符串表示无依赖
+        dep = op.get("depends") or ()
+        depends.append((dep,) if isinstance(dep, str) else tuple(name for name in dep if name))
+
+    name_to_id = {name: i for i, name in enumerate(names)}
+    dep_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    dep_ids = []
+    unresolved = {}
+    for i, deps in enumerate(depends):
+        for dep in deps:
+            dep_id = name_to_id.get(dep)
+            if dep_id is None:
+                dep_ids.append(UNRESOLVED_DEPENDENCY)
+                unresolved.setdefault(i, []).append(dep)
+            else:
+                dep_ids.append(dep_id)
+        dep_offsets[i + 1] = len(dep_ids)
+    return CompiledWorkload(names, np.array(op_type, dtype=np.int8), np.array(amount, dtype=np.float64),
+                            np.array(src_rank, dtype=np.int32), np.array(dst_rank, dtype=np.int32),
+                            dep_offsets, np.array(dep_ids, dtype=np.int32), unresolved)
+
+
+def workload_hash(workload_file):
+    """workload文件内容的哈希（含编译格式版本）"""
+    digest = hashlib.sha1(f"v{COMPILED_FORMAT_VERSION}".encode())
+    with open(workload_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_workload(workload_file, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    读取编译后的workload：内容哈希命中缓存时直接加载，否则流式编译并写入缓存
+    cache_dir为None时不使用缓存
+    """
+    if cache_dir is None:
+        return compile_workload(workload_file)
+    base_name = os.path.splitext(os.path.basename(workload_file))[0]
+    cache_path = os.path.join(cache_dir, f"{base_name}.{workload_hash(workload_file)[:16]}.npz")
+    if os.path.exists(cache_path):
+        return CompiledWorkload.load(cache_path)
+    compiled = compile_workload(workload_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写临时文件再改名，避免并发运行读到写了一半的缓存
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+    compiled.save(tmp_path)
+    os.replace(tmp_path, cache_path)
+    return compiled
+
+
+def add_workload_to_simulator(workload, simulator, topo, rng, path_record=None, routing=ROUTING_STATIC):
+    """
+    把编译后的workload加入仿真器，send op在拓扑的ECMP索引中随机选路
+    op按id顺序加入，节点id = 加入前的节点数 + op id，依赖直接按节点id连边
+    :param path_record: 可选，写入 "流名称: [链路名称, ...]" 的文件对象（动态选路时在流开始时写入）
+    :param routing: 选路模式（见router.py），非static时为仿真器设置router，流开始时按链路负载选路
+    :return: (task_num, flow_num)
+    """
+    router = make_router(routing, topo, simulator.links, rng, path_record=path_record)
+    if router is not None:
+        simulator.router = router
+    task_num = 0
+    flow_num = 0
+    names = workload.names
+    op_type = workload.op_type.tolist()
+    amount = workload.amount.tolist()
+    src_rank = workload.src_rank.tolist()
+    dst_rank = workload.dst_rank.tolist()
+    dep_offsets = workload.dep_offsets.tolist()
+    dep_ids = workload.dep_ids.tolist()
+    base = len(simulator.nodes)
+    for op_id, name in enumerate(names):
+        dependency = [base + dep for dep in dep_ids[dep_offsets[op_id]:dep_offsets[op_id + 1]] if dep >= 0]
+        dependency.extend(workload.unresolved.get(op_id, ()))
+        if op_type[op_id] == OP_GPU:
+            simulator.add_task(name, amount[op_id], dependency=dependency)
+            task_num += 1
+        else:
+            route = (str(src_rank[op_id]), str(dst_rank[op_id]))
+            flow_link_path = topo.choose_path(*route, rng)
+            flow_name_path = topo.path_names(flow_link_path)
+            if path_record is not None and router is None:
+                path_record.write(f"{name}: {flow_name_path}\n")
+            flow_path = [simulator.links[link_name] for link_name in flow_name_path]
+            simulator.add_flow(name, amount[op_id], flow_path, dependency=dependency,
+                               route=route if router is not None else None)
+            flow_num += 1
+    return task_num, flow_num
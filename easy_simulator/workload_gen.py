@@ -0,0 +1,179 @@
+import argparse
+import json
+import random
+
+
+def rank_of(dp_index, pp_index, tp_index, pp, tp):
+    """(DP, PP, TP)下标对应的rank：TP最内层，其次PP，最外层DP"""
+    return (dp_index * pp + pp_index) * tp + tp_index
+
+
+class _RankOps:
+    """单个rank上按生成顺序排列的op"""
+    def __init__(self):
+        self.ops = []
+
+    def gpu(self, name, depends, duration):
+        self.ops.append({"op_type": "gpu", "op_name": name, "depends": depends, "duration": duration})
+        return name
+
+    def send(self, name, depends, size, src_rank, dst_rank):
+        self.ops.append({"op_type": "send", "op_name": name, "depends": depends, "size": size,
+                         "src_rank": src_rank, "dst_rank": dst_rank})
+        return name
+
+
+def generate_workload(pp, dp, tp=1, vpp=1, micro_batches=8, ranks=None, forward_time=2.0, backward_time=4.0,
+                      activation_size=32, gradient_size=1024, tp_size=None, jitter=0, seed=0):
+    """
+    生成LLM并行训练一个迭代的workload（与16-rack-simulate.py读取的op格式相同）
+    - 每个DP副本有pp*vpp个虚拟stage，第c个模型块的第p个stage在PP下标为p的rank上（交错流水线）
+    - 前向：每个micro-batch依次经过各虚拟stage，stage之间发送激活（DATA_F...）
+    - 反向：逆序经过各虚拟stage，stage之间发送梯度（DATA_B...）
+    - tp > 1 时每次计算后在TP组内沿环发送一次（TP_...），大小默认为环形all-reduce的每rank发送量
+    - 反向全部完成后，同一(PP, TP)下标的各DP副本做环形all-reduce（DATA{step}_F999_...），共2*(dp-1)步
+    同一rank上的计算按广度优先流水线顺序串行：先依次做各模型块所有micro-batch的前向，
+    再逆序做各模型块的反向；计算同时依赖跨rank收到的数据和本rank上的前一个计算（depends为列表）
+    :param ranks: rank总数，给出时必须等于pp*dp*tp
+    :param forward_time: 每个micro-batch在一个PP stage上的前向时间（ms），由vpp个模型块平分
+    :param backward_time: 反向时间（ms），同上
+    :param activation_size: stage之间每个micro-batch的激活/梯度大小（MB）
+    :param gradient_size: 每个rank参与DP all-reduce的梯度大小（MB）
+    :param tp_size: TP组内每次计算后的发送大小（MB）
+    :param jitter: 计算时间的相对随机扰动（均匀分布，±jitter）
+    :return: 生成器，依次产出每个rank的 {"ops": [...]}（按rank编号）
+    """
+    if ranks is not None and ranks != pp * dp * tp:
+        raise ValueError(f"ranks({ranks})必须等于pp*dp*tp({pp * dp * tp})")
+    if tp_size is None:
+        tp_size = 2 * activation_size * (tp - 1) / tp
+    rng = random.Random(seed)
+    stages = pp * vpp
+    rank_ops = [_RankOps() for _ in range(pp * dp * tp)]
+    rank_computes = [[] for _ in rank_ops]     # rank -> [(执行顺序, 计算op), ...]
+
+    def duration(base):
+        return base / vpp * (1 + rng.uniform(-jitter, jitter)) if jitter else base / vpp
+
+    def compute(d, stage, t, name, depends, base_time, order):
+        """在虚拟stage上计算，返回该计算（含TP通信）完成的标志op名称"""
+        p = stage % pp
+        rank = rank_of(d, p, t, pp, tp)
+        done = rank_ops[rank].gpu(f"{name}_DP{d}_PP{p}_TP{t}_C{stage // pp}_Rank{rank}", depends, duration(base_time))
+        rank_computes[rank].append((order, rank_ops[rank].ops[-1]))
+        if tp == 1:
+            return done
+        peer = rank_of(d, p, (t + 1) % tp, pp, tp)
+        return rank_ops[rank].send(f"TP_{done}_Rank{peer}", done, tp_size, rank, peer)
+
+    def tp_done(done):
+        """TP组内各rank计算完成的标志：rank t的后续op依赖从rank t-1收到的TP发送"""
+        if tp == 1:
+            return done
+        return [done[(t - 1) % tp] for t in range(tp)]
+
+    backward_done = {}          # (DP, PP, TP) -> 该rank反向全部完成的标志
+    for d in range(dp):
+        last_forward = {}       # (stage, t) -> 最近一次前向的完成标志
+        last_backward = {}      # PP下标p, t -> 该rank上最后一次反向的完成标志
+        for m in range(micro_batches):
+            # 前向
+            incoming = [""] * tp
+            for stage in range(stages):
+                order = (0, stage // pp, m)
+                done = tp_done([compute(d, stage, t, f"F{m}", incoming[t], forward_time, order) for t in range(tp)])
+                for t in range(tp):
+                    last_forward[(stage, t)] = done[t]
+                if stage == stages - 1:
+                    break
+                src_p, dst_p = stage % pp, (stage + 1) % pp
+                incoming = []
+                for t in range(tp):
+                    src, dst = rank_of(d, src_p, t, pp, tp), rank_of(d, dst_p, t, pp, tp)
+                    if src == dst:
+                        incoming.append(done[t])    # pp == 1时相邻模型块在同一rank上，不需要发送
+                        continue
+                    incoming.append(rank_ops[src].send(
+                        f"DATA_F{m}_DP{d}_PP{src_p}_TP{t}_C{stage // pp}_Rank{src}_Rank{dst}",
+                        done[t], activation_size, src, dst))
+            # 反向（从最后一个虚拟stage的前向开始）
+            incoming = [last_forward[(stages - 1, t)] for t in range(tp)]
+            for stage in reversed(range(stages)):
+                order = (1, vpp - 1 - stage // pp, m)
+                done = tp_done([compute(d, stage, t, f"B{m}", incoming[t], backward_time, order) for t in range(tp)])
+                for t in range(tp):
+                    last_backward[(stage % pp, t)] = done[t]
+                if stage == 0:
+                    break
+                src_p, dst_p = stage % pp, (stage - 1) % pp
+                incoming = []
+                for t in range(tp):
+                    src, dst = rank_of(d, src_p, t, pp, tp), rank_of(d, dst_p, t, pp, tp)
+                    if src == dst:
+                        incoming.append(done[t])    # pp == 1时相邻模型块在同一rank上，不需要发送
+                        continue
+                    incoming.append(rank_ops[src].send(
+                        f"DATA_B{m}b_DP{d}_PP{src_p}_TP{t}_C{stage // pp}_Rank{src}_Rank{dst}",
+                        done[t], activation_size, src, dst))
+        for p in range(pp):
+            for t in range(tp):
+                backward_done[(d, p, t)] = last_backward[(p, t)]
+
+    # DP环形all-reduce：第step步rank d发给d+1，依赖上一步从d-1收到的数据
+    if dp > 1:
+        chunk = gradient_size / dp
+        for p in range(pp):
+            for t in range(tp):
+                depends = [backward_done[(d, p, t)] for d in range(dp)]
+                for step in range(2 * (dp - 1)):
+                    sent = []
+                    for d in range(dp):
+                        src, dst = rank_of(d, p, t, pp, tp), rank_of((d + 1) % dp, p, t, pp, tp)
+                        sent.append(rank_ops[src].send(f"DATA{step}_F999_DP{d}_PP{p}_TP{t}_Rank{src}_Rank{dst}",
+                                                       depends[d], chunk, src, dst))
+                    depends = [sent[(d - 1) % dp] for d in range(dp)]
+
+    # 同一rank上的计算串行执行
+    for computes in rank_computes:
+        computes.sort(key=lambda item: item[0])
+        for (_, previous), (_, op) in zip(computes, computes[1:]):
+            op["depends"] = [op["depends"], previous["op_name"]] if op["depends"] else previous["op_name"]
+
+    for ops in rank_ops:
+        yield {"ops": ops.ops}
+
+
+def write_workload(entries, output_file):
+    """逐个条目写出workload的JSON数组（不需要把整个workload放在一个字符串里）"""
+    with open(output_file, "w") as f:
+        f.write("[")
+        for i, entry in enumerate(entries):
+            if i:
+                f.write(",\n")
+            json.dump(entry, f)
+        f.write("]\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成LLM并行训练的合成workload")
+    parser.add_argument("--pp", type=int, default=4)
+    parser.add_argument("--dp", type=int, default=4)
+    parser.add_argument("--tp", type=int, default=1)
+    parser.add_argument("--vpp", type=int, default=1)
+    parser.add_argument("--micro-batches", type=int, default=8)
+    parser.add_argument("--ranks", type=int, default=None)
+    parser.add_argument("--forward-time", type=float, default=2.0, help="ms")
+    parser.add_argument("--backward-time", type=float, default=4.0, help="ms")
+    parser.add_argument("--activation-size", type=float, default=32, help="MB")
+    parser.add_argument("--gradient-size", type=float, default=1024, help="MB")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    output = args.output or (f"workload_{args.pp * args.dp * args.tp}_PP{args.pp}_DP{args.dp}_TP{args.tp}"
+                             f"_VPP{args.vpp}_BATCH{args.micro_batches}.json")
+    write_workload(generate_workload(args.pp, args.dp, args.tp, args.vpp, args.micro_batches, args.ranks,
+                                     args.forward_time, args.backward_time, args.activation_size,
+                                     args.gradient_size, jitter=args.jitter, seed=args.seed), output)
+    print(output)